@@ -28,6 +28,7 @@ from services.system_monitor import (
     get_queue_statistics as monitor_queue_statistics,
 )
 from services.s3_service import s3_service
+from services.dify_service import dify_service
 from config import settings
 
 router = APIRouter()
@@ -421,9 +422,9 @@ async def get_file_logs(file_id: str, db: Session = Depends(get_db)):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"获取处理日志失败: {str(e)}")
 @router.get("/system/status", summary="获取系统状态概览")
-async def get_system_status():
+async def get_system_status(detailed: bool = Query(False, description="是否包含Celery任务数统计")):
     try:
-        return get_system_snapshot()
+        return get_system_snapshot(detailed=detailed)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"获取系统状态失败: {str(e)}")
 
@@ -455,8 +456,8 @@ async def get_system_dify_status():
 @router.post("/system/dify/test", summary="测试Dify连接")
 async def test_system_dify_connection():
     try:
-        overview = get_dify_overview()
-        return overview.get("connection", overview)
+        # 主动测试，不使用概览缓存
+        return dify_service.check_api_connection()
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"测试Dify连接失败: {str(e)}")
 
@@ -13,11 +13,29 @@ class Settings(BaseSettings):
     s3_bucket_name: str = Field(default_factory=lambda: os.getenv("S3_BUCKET_NAME", "oa-documents"))
     s3_region: str = Field(default_factory=lambda: os.getenv("S3_REGION", "us-east-1"))
     s3_endpoint_url: Optional[str] = Field(default_factory=lambda: os.getenv("S3_ENDPOINT_URL"))
+    # S3客户端连接池大小（下载任务与健康检查并发共用同一客户端）
+    s3_max_pool_connections: int = Field(default_factory=lambda: int(os.getenv("S3_MAX_POOL_CONNECTIONS", "50")))
     
     # OpenAI配置
     openai_api_key: str = Field(default_factory=lambda: os.getenv("OPENAI_API_KEY", ""))
     openai_base_url: Optional[str] = Field(default_factory=lambda: os.getenv("OPENAI_BASE_URL"))
     openai_model_name: str = Field(default_factory=lambda: os.getenv("OPENAI_MODEL_NAME", "gpt-4"))
+    # 版本比较/有效期检查是否通过Batch API批量提交（自定义base_url不支持Batch API时请关闭）
+    openai_batch_enabled: bool = Field(default_factory=lambda: os.getenv("OPENAI_BATCH_ENABLED", "false").lower() == "true")
+    # Batch任务轮询间隔秒数
+    openai_batch_poll_interval: int = Field(default_factory=lambda: int(os.getenv("OPENAI_BATCH_POLL_INTERVAL", "30")))
+    # Batch任务最长等待秒数，超时后取消任务并回退为逐条调用
+    openai_batch_max_wait: int = Field(default_factory=lambda: int(os.getenv("OPENAI_BATCH_MAX_WAIT", "3600")))
+    # 版本比较/有效期检查是否使用json_schema结构化输出（模型或接口不支持时保持关闭，使用json_object）
+    openai_json_schema_enabled: bool = Field(default_factory=lambda: os.getenv("OPENAI_JSON_SCHEMA_ENABLED", "false").lower() == "true")
+    # 有效期检查时每次对话合并判断的文档数（过大会降低判断准确率，建议不超过16）
+    openai_expiration_batch_size: int = Field(default_factory=lambda: int(os.getenv("OPENAI_EXPIRATION_BATCH_SIZE", "8")))
+    # 版本比较/有效期检查的AI结果在Redis中的缓存秒数（0表示不缓存）
+    ai_verdict_cache_ttl: int = Field(default_factory=lambda: int(os.getenv("AI_VERDICT_CACHE_TTL", "604800")))
+    # 文档预览在Redis中的缓存秒数（版本去重与有效期检查共用，0表示不缓存）
+    preview_cache_ttl: int = Field(default_factory=lambda: int(os.getenv("PREVIEW_CACHE_TTL", "86400")))
+    # 待人工审核文档的解析内容在Redis中的缓存秒数（审核时免去重新下载、解密和解析，0表示不缓存）
+    approval_content_cache_ttl: int = Field(default_factory=lambda: int(os.getenv("APPROVAL_CONTENT_CACHE_TTL", "259200")))
     
     # Dify配置
     dify_api_key: str = Field(default_factory=lambda: os.getenv("DIFY_API_KEY", ""))
@@ -30,6 +48,18 @@ class Settings(BaseSettings):
     # 应用配置
     secret_key: str = Field(default_factory=lambda: os.getenv("SECRET_KEY", "your-secret-key-here"))
     debug: bool = Field(default_factory=lambda: os.getenv("DEBUG", "False").lower() == "true")
+    # 系统健康检查/看板数据的缓存秒数（0表示不缓存）
+    health_cache_ttl: int = Field(default_factory=lambda: int(os.getenv("HEALTH_CACHE_TTL", "5")))
+    # 系统状态快照中单项探测的最长等待时间（毫秒），超时的探测项报告为timeout
+    health_probe_deadline_ms: int = Field(default_factory=lambda: int(os.getenv("HEALTH_PROBE_DEADLINE_MS", "800")))
+    # Redis探活结果复用秒数：距上次成功探测不足该时间时不再发送PING（0表示每次都探测）
+    redis_probe_interval: int = Field(default_factory=lambda: int(os.getenv("REDIS_PROBE_INTERVAL", "10")))
+    # S3存储桶连通性检查结果缓存秒数
+    s3_probe_ttl: int = Field(default_factory=lambda: int(os.getenv("S3_PROBE_TTL", "10")))
+    # S3存储统计在Redis中的缓存秒数（0表示不缓存）
+    s3_stats_ttl: int = Field(default_factory=lambda: int(os.getenv("S3_STATS_TTL", "300")))
+    # Dify集成概览缓存秒数
+    dify_overview_ttl: int = Field(default_factory=lambda: int(os.getenv("DIFY_OVERVIEW_TTL", "30")))
     base_url: str = Field(default_factory=lambda: os.getenv("BASE_URL", "http://localhost:8000"))
     
     # 文档处理配置
@@ -38,6 +68,8 @@ class Settings(BaseSettings):
 
     # 文档解析接口配置
     document_parse_api_url: str = Field(default_factory=lambda: os.getenv("DOCUMENT_PARSE_API_URL", "http://document-parser:8080"))
+    # 解析结果缓存条目数（按文件内容哈希缓存，0表示关闭）
+    document_parse_cache_size: int = Field(default_factory=lambda: int(os.getenv("DOCUMENT_PARSE_CACHE_SIZE", "128")))
 
     # AI分析配置
     ai_analysis_max_length: int = Field(default_factory=lambda: int(os.getenv("AI_ANALYSIS_MAX_LENGTH", "50000")))
@@ -68,6 +100,8 @@ class Settings(BaseSettings):
     filter_case_sensitive_keywords: bool = Field(default_factory=lambda: os.getenv("FILTER_CASE_SENSITIVE_KEYWORDS", "false").lower() == "true")
     filter_max_file_size_mb: int = Field(default_factory=lambda: int(os.getenv("FILTER_MAX_FILE_SIZE_MB", "100")))
     filter_min_file_size_bytes: int = Field(default_factory=lambda: int(os.getenv("FILTER_MIN_FILE_SIZE_BYTES", "100")))
+    # 筛选统计结果缓存秒数（0表示不缓存）
+    filter_stats_cache_ttl: int = Field(default_factory=lambda: int(os.getenv("FILTER_STATS_CACHE_TTL", "30")))
 
     # DAT文件导入配置
     dat_import_directory: str = Field(default_factory=lambda: os.getenv("DAT_IMPORT_DIRECTORY", "/data/dat_files"))
@@ -1,3 +1,4 @@
+from contextlib import contextmanager
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker, Session
 from sqlalchemy.pool import StaticPool
@@ -14,7 +15,9 @@ engine = create_engine(
     settings.database_url,
     poolclass=StaticPool,
     connect_args={"check_same_thread": False} if "sqlite" in settings.database_url else {},
-    echo=settings.debug
+    echo=settings.debug,
+    # 编译后SQL语句缓存条目数（SQLAlchemy默认500），看板与任务中的固定查询可反复复用
+    query_cache_size=1200
 )
 
 # 创建会话工厂
@@ -40,3 +43,16 @@ def get_db() -> Session:
 def get_db_session() -> Session:
     """获取数据库会话（用于Celery任务）"""
     return SessionLocal()
+
+@contextmanager
+def session_scope():
+    """会话上下文管理器：正常结束时提交，异常时回滚，最终关闭会话"""
+    db = SessionLocal()
+    try:
+        yield db
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
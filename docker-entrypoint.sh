@@ -85,7 +85,8 @@ start_celery_worker() {
     exec celery -A tasks.document_processor worker \
         --loglevel=info \
         --concurrency=2 \
-        --max-tasks-per-child=1000 \
+        --max-tasks-per-child=50 \
+        -Ofair \
         --queues=document_processing,batch_processing
 }
 
@@ -105,16 +106,17 @@ start_celery_flower() {
         --port=5555
 }
 
-# # 运行数据库迁移
-# run_migrations() {
-#     echo "📊 运行数据库迁移..."
-#     python -c "
-# from database import init_db
-# print('初始化数据库...')
-# init_db()
-# print('✅ 数据库初始化完成')
-#     "
-# }
+# 运行数据库迁移（建表后为已有表补充新增的列和索引）
+run_migrations() {
+    echo "📊 运行数据库迁移..."
+    python -c "
+from database import init_db
+print('初始化数据库...')
+init_db()
+print('✅ 数据库初始化完成')
+    "
+    python run_schema_migration.py upgrade
+}
 
 # 显示帮助信息
 show_help() {
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Integer, Boolean, Text, DateTime, Enum as SQLEnum, ForeignKey
+from sqlalchemy import Column, String, Integer, Boolean, Text, Date, DateTime, Enum as SQLEnum, ForeignKey, Index, DDL, event, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
@@ -105,6 +105,21 @@ class OAFileInfo(Base):
     """OA系统文件信息模型"""
     
     __tablename__ = "oa_file_info"
+    __table_args__ = (
+        # 重复文件检测按 文件名+大小 查询
+        Index('ix_oa_file_info_filename_filesize', 'imagefilename', 'filesize'),
+        # 版本去重按标题 LIKE '%标题%' 查找相似文档，PostgreSQL 下使用 pg_trgm 三元组索引避免全表扫描
+        Index(
+            'ix_oa_file_info_filename_trgm', 'imagefilename',
+            postgresql_using='gin',
+            postgresql_ops={'imagefilename': 'gin_trgm_ops'},
+        ).ddl_if(dialect='postgresql'),
+        # 批量处理按 is_zw + PENDING 领取待处理文件，使用部分索引只索引待处理的正文，处理完成后自动移出索引
+        Index(
+            'ix_oa_file_info_pending', 'id',
+            postgresql_where=text("is_zw AND processing_status = 'PENDING'"),
+        ).ddl_if(dialect='postgresql'),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     
@@ -119,10 +134,11 @@ class OAFileInfo(Base):
     filesize = Column(Integer, comment="文件大小（字节）")
     asecode = Column(String(255), comment="OSS下载解密code")
     tokenkey = Column(String(500), comment="OSS下载key")
+    content_sha256 = Column(String(64), index=True, comment="文件内容SHA256（解密后，用于内容去重）")
     
     # 处理状态
     processing_status = Column(SQLEnum(ProcessingStatus), default=ProcessingStatus.PENDING, 
-                              nullable=False, comment="处理状态")
+                              nullable=False, index=True, comment="处理状态")
     processing_message = Column(Text, comment="处理消息")
     processing_started_at = Column(DateTime, comment="开始处理时间")
     processing_completed_at = Column(DateTime, comment="完成处理时间")
@@ -131,6 +147,9 @@ class OAFileInfo(Base):
     ai_analysis_result = Column(Text, comment="AI分析结果（JSON格式）")
     ai_confidence_score = Column(Integer, comment="AI置信度（0-100）")
     should_add_to_kb = Column(Boolean, comment="是否应该加入知识库")
+    # 从AI分析结果的ai_metadata.expiration_date解析得到，有效期检查直接按列查询
+    expiration_date_parsed = Column(Date, index=True, comment="有效期截止日期")
+    expiration_is_permanent = Column(Boolean, comment="是否永久有效")
     
     
     # 关联的Document ID（处理成功后）
@@ -167,3 +186,15 @@ class ProcessingLog(Base):
     
     def __repr__(self):
         return f"<ProcessingLog(file_id={self.file_id}, step={self.step}, status={self.status})>"
+
+
+# “最近活动/最近错误”查询按 created_at 倒序取前N条，使用倒序索引避免全表排序
+Index('ix_processing_logs_created_at', ProcessingLog.created_at.desc())
+Index('ix_processing_logs_status_created_at', ProcessingLog.status, ProcessingLog.created_at.desc())
+
+# 三元组索引依赖 pg_trgm 扩展，建表前确保扩展已安装
+event.listen(
+    OAFileInfo.__table__,
+    'before_create',
+    DDL('CREATE EXTENSION IF NOT EXISTS pg_trgm').execute_if(dialect='postgresql'),
+)
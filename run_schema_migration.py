@@ -0,0 +1,152 @@
+"""
+数据库结构迁移脚本：为已部署的数据库补充新增的列和索引
+描述：应用启动时的 create_all 只会创建不存在的表，不会修改已有表；
+      已有数据库升级代码后需先执行本脚本（仅支持 PostgreSQL，所有语句均可重复执行）
+"""
+
+import logging
+import os
+import sys
+from typing import List, Tuple
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+
+from database import engine
+
+# 配置日志输出
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# (迁移说明, SQL语句列表)，按顺序执行；
+# 索引使用 CONCURRENTLY 创建，不阻塞线上读写，因此需在自动提交模式下逐条执行
+MIGRATIONS: List[Tuple[str, List[str]]] = [
+    ("oa_file_info.content_sha256 文件内容哈希（内容去重）", [
+        "ALTER TABLE oa_file_info ADD COLUMN IF NOT EXISTS content_sha256 VARCHAR(64)",
+        "COMMENT ON COLUMN oa_file_info.content_sha256 IS '文件内容SHA256（解密后，用于内容去重）'",
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_oa_file_info_content_sha256 "
+        "ON oa_file_info (content_sha256)",
+    ]),
+    ("oa_file_info.expiration_date_parsed / expiration_is_permanent 有效期列", [
+        "ALTER TABLE oa_file_info ADD COLUMN IF NOT EXISTS expiration_date_parsed DATE",
+        "ALTER TABLE oa_file_info ADD COLUMN IF NOT EXISTS expiration_is_permanent BOOLEAN",
+        "COMMENT ON COLUMN oa_file_info.expiration_date_parsed IS '有效期截止日期'",
+        "COMMENT ON COLUMN oa_file_info.expiration_is_permanent IS '是否永久有效'",
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_oa_file_info_expiration_date_parsed "
+        "ON oa_file_info (expiration_date_parsed)",
+    ]),
+    ("oa_file_info 查询索引（重复检测、标题相似查找、状态筛选、待处理领取）", [
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_oa_file_info_filename_filesize "
+        "ON oa_file_info (imagefilename, filesize)",
+        "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_oa_file_info_filename_trgm "
+        "ON oa_file_info USING gin (imagefilename gin_trgm_ops)",
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_oa_file_info_processing_status "
+        "ON oa_file_info (processing_status)",
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_oa_file_info_pending "
+        "ON oa_file_info (id) WHERE is_zw AND processing_status = 'PENDING'",
+    ]),
+    ("processing_logs 最近活动/最近错误查询索引", [
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_processing_logs_created_at "
+        "ON processing_logs (created_at DESC)",
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_processing_logs_status_created_at "
+        "ON processing_logs (status, created_at DESC)",
+    ]),
+]
+
+DEFAULT_BACKFILL_BATCH_SIZE = 500
+
+
+def upgrade() -> int:
+    """执行全部迁移语句，返回执行的语句数"""
+    if engine.dialect.name != 'postgresql':
+        raise RuntimeError(f"仅支持 PostgreSQL，当前数据库: {engine.dialect.name}")
+
+    executed = 0
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        for description, statements in MIGRATIONS:
+            logger.info("执行迁移: %s", description)
+            for statement in statements:
+                conn.execute(text(statement))
+                executed += 1
+
+    logger.info("迁移完成，共执行 %s 条语句", executed)
+    return executed
+
+
+def backfill_expiration(batch_size: int = DEFAULT_BACKFILL_BATCH_SIZE) -> int:
+    """
+    从已有的AI分析结果回填有效期列（只处理尚未回填的记录，可重复执行）
+
+    Returns:
+        回填的记录数
+    """
+    # 与入库时使用同一解析逻辑
+    from services.version_manager import VersionManager
+    from utils.json_utils import json_loads
+
+    select_sql = text(
+        "SELECT id, ai_analysis_result FROM oa_file_info "
+        "WHERE id > :last_id AND ai_analysis_result IS NOT NULL AND expiration_is_permanent IS NULL "
+        "ORDER BY id LIMIT :limit"
+    )
+    update_sql = text(
+        "UPDATE oa_file_info SET expiration_date_parsed = :parsed, expiration_is_permanent = :permanent "
+        "WHERE id = :id"
+    )
+
+    last_id = 0
+    updated = 0
+    while True:
+        with engine.begin() as conn:
+            rows = conn.execute(select_sql, {'last_id': last_id, 'limit': batch_size}).all()
+            if not rows:
+                break
+
+            params = []
+            for row in rows:
+                try:
+                    ai_metadata = (json_loads(row.ai_analysis_result) or {}).get('ai_metadata') or {}
+                    expiration_value = ai_metadata.get('expiration_date')
+                except (ValueError, AttributeError):
+                    expiration_value = None
+                parsed, permanent = VersionManager.parse_expiration_date(expiration_value)
+                params.append({'id': row.id, 'parsed': parsed, 'permanent': permanent})
+
+            conn.execute(update_sql, params)
+
+        last_id = rows[-1].id
+        updated += len(rows)
+        logger.info("已回填 %s 条记录", updated)
+
+    logger.info("有效期回填完成，共 %s 条记录", updated)
+    return updated
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="为已部署的数据库补充新增的列和索引")
+    subparsers = parser.add_subparsers(dest="action", required=True)
+
+    subparsers.add_parser("upgrade", help="添加新增的列和索引")
+
+    backfill_parser = subparsers.add_parser("backfill-expiration", help="从AI分析结果回填有效期列")
+    backfill_parser.add_argument("--batch-size", type=int, default=DEFAULT_BACKFILL_BATCH_SIZE,
+                                 help="每批回填的记录数")
+
+    args = parser.parse_args()
+
+    try:
+        if args.action == "upgrade":
+            upgrade()
+        elif args.action == "backfill-expiration":
+            backfill_expiration(batch_size=max(1, args.batch_size))
+    except SQLAlchemyError as exc:
+        logger.error("数据库错误: %s", exc)
+        sys.exit(2)
+    except Exception as exc:
+        logger.error("迁移失败: %s", exc)
+        sys.exit(3)
@@ -1,6 +1,12 @@
 import requests
 import logging
-from typing import Dict, List, Optional
+import os
+import copy
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
 from config import settings
 
 logger = logging.getLogger(__name__)
@@ -8,6 +14,18 @@ logger = logging.getLogger(__name__)
 class ApiDocumentParser:
     """通过接口进行文档解析的服务类"""
 
+    # 文件名黑名单（预编译为单个正则，一次扫描完成匹配）
+    _BLACKLIST_KEYWORDS = [
+        'test', 'temp', 'backup', 'log', 'cache',
+        '测试', '临时', '备份', '日志', '缓存'
+    ]
+    _BLACKLIST_RE = re.compile('|'.join(map(re.escape, _BLACKLIST_KEYWORDS)))
+
+    # 明确不支持解析的扩展名，直接拒绝，避免上传到解析接口
+    _HARD_REJECT_EXTENSIONS = frozenset({
+        'exe', 'dll', 'zip', 'tar', 'gz', 'mp3', 'mp4'
+    })
+
     def __init__(self):
         # 从配置中获取文档解析接口的基础URL
         self.parse_api_url = getattr(settings, 'document_parse_api_url', None)
@@ -25,6 +43,11 @@ class ApiDocumentParser:
         # AI解析文本长度限制（字符数）
         self.ai_analysis_max_length = getattr(settings, 'ai_analysis_max_length', 50000)
 
+        # 解析结果缓存（按文件内容哈希），相同文档重复入库时无需再次调用解析接口
+        self.parse_cache_size = getattr(settings, 'document_parse_cache_size', 128)
+        self._parse_cache: "OrderedDict[Tuple[str, str], Dict]" = OrderedDict()
+        self._parse_cache_lock = threading.Lock()
+
     def parse_document(self, file_data: bytes, filename: str) -> Dict:
         """
         通过接口解析文档内容
@@ -36,6 +59,24 @@ class ApiDocumentParser:
         Returns:
             Dict: 包含解析结果的字典
         """
+        ext = os.path.splitext(filename or '')[1].lower().lstrip('.')
+        if ext in self._HARD_REJECT_EXTENSIONS:
+            error_msg = f"不支持解析的文件类型: .{ext}"
+            logger.warning(f"{error_msg} ({filename})")
+            return {
+                'success': False,
+                'error': error_msg,
+                'file_type': ext,
+                'content': '',
+                'metadata': {}
+            }
+
+        cache_key = self._cache_key(file_data, filename)
+        cached_result = self._get_cached_result(cache_key)
+        if cached_result is not None:
+            logger.info(f"命中解析缓存: {filename}")
+            return cached_result
+
         try:
             logger.info(f"通过接口解析文档: {filename}")
 
@@ -102,7 +143,7 @@ class ApiDocumentParser:
                     if 'sheet_name' in first_chunk_metadata:
                         metadata['sheet_name'] = first_chunk_metadata['sheet_name']
 
-                return {
+                parse_result = {
                     'success': True,
                     'file_type': result.get('file_type', 'unknown'),
                     'content': full_content,
@@ -110,6 +151,8 @@ class ApiDocumentParser:
                     'content_length': len(full_content),
                     'error': None
                 }
+                self._store_cached_result(cache_key, parse_result)
+                return copy.deepcopy(parse_result)
 
             else:
                 error_msg = f"文档解析API请求失败: HTTP {response.status_code} - {response.text}"
@@ -144,9 +187,7 @@ class ApiDocumentParser:
             }
         except Exception as e:
             error_msg = f"文档解析失败: {str(e)}"
-            logger.error(error_msg)
-            import traceback
-            traceback.print_exc()
+            logger.exception(error_msg)
             return {
                 'success': False,
                 'error': error_msg,
@@ -155,6 +196,41 @@ class ApiDocumentParser:
                 'metadata': {}
             }
 
+    def _cache_key(self, file_data: bytes, filename: str) -> Tuple[str, str]:
+        """根据文件内容哈希和扩展名生成缓存键"""
+        content_hash = hashlib.blake2b(file_data, digest_size=16).hexdigest()
+        ext = os.path.splitext(filename or '')[1].lower()
+        return content_hash, ext
+
+    def _get_cached_result(self, cache_key: Tuple[str, str]) -> Optional[Dict]:
+        """读取缓存的解析结果（返回副本，避免调用方修改缓存内容）"""
+        if self.parse_cache_size <= 0:
+            return None
+
+        with self._parse_cache_lock:
+            cached = self._parse_cache.get(cache_key)
+            if cached is None:
+                return None
+            self._parse_cache.move_to_end(cache_key)
+
+        return copy.deepcopy(cached)
+
+    def _store_cached_result(self, cache_key: Tuple[str, str], parse_result: Dict):
+        """写入解析结果缓存，超出容量时淘汰最久未使用的条目"""
+        if self.parse_cache_size <= 0:
+            return
+
+        with self._parse_cache_lock:
+            self._parse_cache[cache_key] = parse_result
+            self._parse_cache.move_to_end(cache_key)
+            while len(self._parse_cache) > self.parse_cache_size:
+                self._parse_cache.popitem(last=False)
+
+    def clear_cache(self):
+        """清空解析结果缓存"""
+        with self._parse_cache_lock:
+            self._parse_cache.clear()
+
     def _concatenate_chunks(self, chunks: List[Dict]) -> str:
         """
         将文本块拼接成完整文本
@@ -187,29 +263,28 @@ class ApiDocumentParser:
         基于简单规则判断文档是否适合加入知识库
         """
         try:
-            # 文件名黑名单
-            blacklist_keywords = [
-                'test', 'temp', 'backup', 'log', 'cache',
-                '测试', '临时', '备份', '日志', '缓存'
-            ]
+            # 内容长度检查（先用原始长度快速排除，首尾空白对10万字符的上限影响可忽略）
+            content_length = len(content)
+            if content_length < 100 or content_length > 100000:
+                return False
 
+            # 文件名黑名单
             filename_lower = filename.lower()
-            for keyword in blacklist_keywords:
-                if keyword in filename_lower:
-                    return False
-
-            # 内容长度检查
-            if len(content.strip()) < 100:  # 内容太短
+            if self._BLACKLIST_RE.search(filename_lower):
                 return False
 
-            if len(content.strip()) > 100000:  # 内容太长
+            if len(content.strip()) < 100:  # 去除首尾空白后内容太短
                 return False
 
-            # 内容质量检查
-            lines = content.split('\n')
-            non_empty_lines = [line for line in lines if line.strip()]
+            # 内容质量检查（找到5个有效行即可提前结束）
+            non_empty_lines = 0
+            for line in content.splitlines():
+                if line.strip():
+                    non_empty_lines += 1
+                    if non_empty_lines >= 5:
+                        break
 
-            if len(non_empty_lines) < 5:  # 有效行数太少
+            if non_empty_lines < 5:  # 有效行数太少
                 return False
 
             return True
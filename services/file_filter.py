@@ -1,25 +1,63 @@
+import copy
 import logging
-from typing import Dict, List, Optional, Tuple
+import os
+import re
+import threading
+import time
+from typing import Dict, Iterator, List, Optional, Tuple
 from datetime import datetime
 from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_
+from sqlalchemy import and_, or_, func
 
 from models import OAFileInfo, ProcessingStatus, BusinessCategory
 from utils.file_utils import  format_file_size
-from database import get_db_session
+from database import session_scope
 from config import settings
 
+try:
+    import ahocorasick
+except ImportError:  # 未安装pyahocorasick时退回逐个关键字匹配
+    ahocorasick = None
+
 logger = logging.getLogger(__name__)
 
 
+# 视为已存在（处理中或已处理）的文件状态，同名同大小的文件处于这些状态时判定为重复
+DUPLICATE_STATUSES = (
+    ProcessingStatus.DOWNLOADING,
+    ProcessingStatus.DECRYPTING,
+    ProcessingStatus.PARSING,
+    ProcessingStatus.ANALYZING,
+    ProcessingStatus.AWAITING_APPROVAL,
+    ProcessingStatus.COMPLETED,
+    ProcessingStatus.SKIPPED,
+)
+
+
+# 文件扩展名到文件类型的映射
+EXTENSION_TYPE_MAP = {
+    'pdf': 'pdf',
+    'doc': 'doc',
+    'docx': 'docx',
+    'txt': 'txt',
+    'text': 'txt',
+    'log': 'txt',
+    'html': 'other',
+    'htm': 'other',
+    'xml': 'other',
+    'rtf': 'other',
+    'xls': 'other',
+    'xlsx': 'other',
+    'ppt': 'other',
+    'pptx': 'other',
+}
+
+
 class FileFilter:
     """文件筛选器 - 处理文件类型检测、关键字筛选和重复文件检测"""
 
     def __init__(self):
         """初始化筛选器"""
-        # 从配置文件加载关键字
-        self._load_keywords_from_config()
-
         # 可配置的筛选参数（从配置文件加载）
         self.config = {
             'enable_keyword_filter': settings.filter_enable_keyword_filter,
@@ -28,6 +66,26 @@ class FileFilter:
             'max_file_size_mb': settings.filter_max_file_size_mb,
             'min_file_size_bytes': settings.filter_min_file_size_bytes,
         }
+        self._apply_config()
+
+        # 从配置文件加载关键字
+        self._load_keywords_from_config()
+
+        # 批量筛选时预取的重复文件信息 {(文件名, 文件大小): [文件记录, ...]}
+        self._dup_cache: Dict[Tuple[str, int], List] = {}
+        self._dup_prefetched_names = set()
+
+        # 筛选统计缓存 {limit: (缓存时间, 统计结果)}，避免看板轮询反复扫表
+        self._stats_cache: Dict[int, Tuple[float, Dict]] = {}
+        self._stats_ttl = getattr(settings, 'filter_stats_cache_ttl', 30)
+
+    def _apply_config(self):
+        """将筛选时频繁读取的配置项展开为实例属性，配置变更后需重新调用"""
+        self._enable_kw = self.config['enable_keyword_filter']
+        self._enable_dup = self.config['enable_duplicate_filter']
+        self._case_sensitive = self.config['case_sensitive_keywords']
+        self._min_file_size_bytes = self.config['min_file_size_bytes']
+        self._max_file_size_bytes = self.config['max_file_size_mb'] * 1024 * 1024
 
     def _load_keywords_from_config(self):
         """从配置文件加载关键字"""
@@ -55,20 +113,113 @@ class FileFilter:
             'other': [kw.strip() for kw in settings.filter_keywords_other.split(',') if kw.strip()]
         }
 
+        self._build_keyword_matchers()
+        self._keywords_summary_cache = self._build_keywords_summary()
+
         total_business_keywords = sum(len(v) for v in self.business_category_keywords.values())
-        logger.info(f"已加载关键字配置 - 共用: {len(self.common_keywords)}个, "
-                   f"业务分类: {total_business_keywords}个, "
-                   f"文件类型: {sum(len(v) for v in self.file_type_keywords.values())}个")
+        logger.info("已加载关键字配置 - 共用: %s个, 业务分类: %s个, 文件类型: %s个",
+                    len(self.common_keywords), total_business_keywords,
+                    sum(len(v) for v in self.file_type_keywords.values()))
 
+    def _build_keyword_matchers(self):
+        """
+        预先计算关键字匹配所需的数据：
+        - (原始关键字, 匹配用关键字) 列表，大小写不敏感时匹配用关键字已转为小写
+        - 共用关键字和各业务分类关键字的Aho-Corasick自动机（需安装pyahocorasick）
+        - 未安装pyahocorasick时，改为预编译的正则并集，用于快速判断是否命中
+        """
+        case_sensitive = self._case_sensitive
+
+        def to_pairs(keywords: List[str]) -> List[Tuple[str, str]]:
+            return [(kw, kw if case_sensitive else kw.lower()) for kw in keywords]
+
+        self.common_keywords_lc = to_pairs(self.common_keywords)
+        self.business_category_keywords_lc = {
+            category: to_pairs(keywords) for category, keywords in self.business_category_keywords.items()
+        }
+
+        self._ac_common = None
+        self._ac_by_category = {}
+        self._re_common = None
+        self._re_by_category = {}
+
+        if ahocorasick is None:
+            self._re_common = self._build_keyword_regex(self.common_keywords_lc)
+            for category, keyword_pairs in self.business_category_keywords_lc.items():
+                self._re_by_category[category] = self._build_keyword_regex(keyword_pairs)
+            return
+
+        self._ac_common = self._build_automaton(self.common_keywords_lc)
+        for category, keyword_pairs in self.business_category_keywords_lc.items():
+            self._ac_by_category[category] = self._build_automaton(keyword_pairs)
+
+    @staticmethod
+    def _build_automaton(keyword_pairs: List[Tuple[str, str]]):
+        """构建单个关键字自动机，关键字为空时返回None"""
+        if not keyword_pairs:
+            return None
+
+        automaton = ahocorasick.Automaton()
+        for _, check_keyword in keyword_pairs:
+            automaton.add_word(check_keyword, check_keyword)
+        automaton.make_automaton()
+        return automaton
+
+    @staticmethod
+    def _build_keyword_regex(keyword_pairs: List[Tuple[str, str]]):
+        """将关键字编译为单个正则并集，关键字为空时返回None"""
+        if not keyword_pairs:
+            return None
+        return re.compile('|'.join(re.escape(check_keyword) for _, check_keyword in keyword_pairs))
+
+    @staticmethod
+    def _match_keywords(automaton, keyword_pairs: List[Tuple[str, str]], check_filename: str) -> List[str]:
+        """返回文件名中命中的关键字（保持配置中的原始写法和顺序）"""
+        if automaton is None:
+            # 未安装pyahocorasick：逐个关键字做子串匹配
+            return [orig for orig, check_keyword in keyword_pairs if check_keyword in check_filename]
+
+        hits = {found for _, found in automaton.iter(check_filename)}
+        if not hits:
+            return []
+        return [orig for orig, check_keyword in keyword_pairs if check_keyword in hits]
+
+    @staticmethod
+    def _has_keyword(automaton, pattern, keyword_pairs: List[Tuple[str, str]], check_filename: str) -> bool:
+        """文件名是否命中任一关键字（命中第一个即返回）"""
+        if automaton is not None:
+            return next(automaton.iter(check_filename), None) is not None
+        if pattern is not None:
+            return pattern.search(check_filename) is not None
+        return any(check_keyword in check_filename for _, check_keyword in keyword_pairs)
+
+    def fast_check_keywords(self, filename: str, business_category: BusinessCategory = None) -> bool:
+        """快速判断文件名是否命中跳过关键字，不收集命中明细"""
+        if not filename:
+            return False
+
+        check_filename = filename if self._case_sensitive else filename.lower()
+
+        if self._has_keyword(self._ac_common, self._re_common, self.common_keywords_lc, check_filename):
+            return True
 
+        if business_category and business_category in self.business_category_keywords_lc:
+            return self._has_keyword(
+                self._ac_by_category.get(business_category),
+                self._re_by_category.get(business_category),
+                self.business_category_keywords_lc[business_category],
+                check_filename
+            )
+        return False
 
-    def should_process_file(self, file_info: OAFileInfo, file_data: bytes = None) -> Dict:
+    def should_process_file(self, file_info: OAFileInfo, file_data: bytes = None, db: Session = None) -> Dict:
         """
         判断文件是否应该被处理
 
         Args:
             file_info: 文件信息对象
             file_data: 文件二进制数据（可选，用于类型检测）
+            db: 数据库会话（可选，批量筛选时复用同一会话）
 
         Returns:
             Dict: 筛选结果 {
@@ -88,7 +239,7 @@ class FileFilter:
         }
 
         try:
-            logger.info(f"开始筛选文件: {file_info.imagefilename} (ID: {file_info.imagefileid})")
+            logger.info("开始筛选文件: %s (ID: %s)", file_info.imagefilename, file_info.imagefileid)
 
             # 1. 基础验证
             basic_check = self._basic_validation(file_info)
@@ -110,7 +261,7 @@ class FileFilter:
             #         return result
 
             # 3. 关键字筛选（根据业务分类使用不同关键字）
-            if self.config['enable_keyword_filter']:
+            if self._enable_kw:
                 keyword_check = self._check_keywords(file_info.imagefilename, file_info.business_category)
                 result['filters_applied'].append('keyword_filter')
 
@@ -120,8 +271,8 @@ class FileFilter:
                     return result
 
             # 4. 重复文件检测
-            if self.config['enable_duplicate_filter']:
-                duplicate_check = self._check_duplicate(file_info)
+            if self._enable_dup:
+                duplicate_check = self._check_duplicate(file_info, db)
                 result['duplicate_info'] = duplicate_check
                 result['filters_applied'].append('duplicate_filter')
 
@@ -139,16 +290,92 @@ class FileFilter:
                 result['skip_reason'] = size_check['reason']
                 return result
 
-            logger.info(f"文件筛选通过: {file_info.imagefilename}")
+            logger.info("文件筛选通过: %s", file_info.imagefilename)
             return result
 
         except Exception as e:
-            logger.error(f"文件筛选过程出错: {e}")
+            logger.error("文件筛选过程出错: %s", e)
             result['should_process'] = False
             result['skip_reason'] = f"筛选过程出错: {str(e)}"
             result['filters_applied'].append('error')
             return result
 
+    def should_process_file_batch(self, files: List[OAFileInfo], db: Session = None) -> Iterator[Tuple[OAFileInfo, Dict]]:
+        """
+        批量筛选文件，整批共用一个数据库会话
+
+        Args:
+            files: 文件信息对象列表
+            db: 数据库会话（可选）。传入时只在该会话中查询，不另开会话也不提交，
+                调用方持有的行锁会一直保留到调用方提交
+
+        Yields:
+            Tuple[OAFileInfo, Dict]: (文件信息, 筛选结果)
+        """
+        if db is None:
+            with session_scope() as db:
+                yield from self._filter_batch(files, db)
+        else:
+            yield from self._filter_batch(files, db)
+
+    def _filter_batch(self, files: List[OAFileInfo], db: Session) -> Iterator[Tuple[OAFileInfo, Dict]]:
+        """在给定会话中逐个筛选文件"""
+        if self._enable_dup:
+            self.prefetch_duplicates(files, db=db)
+        try:
+            for file_info in files:
+                yield file_info, self.should_process_file(file_info, db=db)
+        finally:
+            self.clear_duplicate_cache()
+
+    def prefetch_duplicates(self, file_infos: List[OAFileInfo], db: Session = None):
+        """
+        一次查询预取一批文件的重复候选记录，后续 _check_duplicate 直接查内存
+
+        Args:
+            file_infos: 文件信息对象列表
+            db: 数据库会话（可选，传入时不另开会话也不提交）
+        """
+        filenames = {f.imagefilename for f in file_infos if f.imagefilename and f.filesize}
+        self.clear_duplicate_cache()
+        if not filenames:
+            return
+
+        def load(session: Session):
+            return session.query(
+                OAFileInfo.imagefileid,
+                OAFileInfo.imagefilename,
+                OAFileInfo.filesize,
+                OAFileInfo.processing_status,
+                OAFileInfo.created_at
+            ).filter(
+                OAFileInfo.imagefilename.in_(filenames),
+                OAFileInfo.processing_status.in_(DUPLICATE_STATUSES)
+            ).all()
+
+        try:
+            if db is None:
+                with session_scope() as db:
+                    rows = load(db)
+            else:
+                rows = load(db)
+        except Exception as e:
+            logger.warning("预取重复文件信息失败，回退为逐个查询: %s", e)
+            return
+
+        dup_cache: Dict[Tuple[str, int], List] = {}
+        for row in rows:
+            dup_cache.setdefault((row.imagefilename, row.filesize), []).append(row)
+
+        self._dup_cache = dup_cache
+        self._dup_prefetched_names = filenames
+        logger.info("预取重复文件信息: %s 个文件名，%s 条记录", len(filenames), len(rows))
+
+    def clear_duplicate_cache(self):
+        """清空预取的重复文件信息"""
+        self._dup_cache = {}
+        self._dup_prefetched_names = set()
+
     def _basic_validation(self, file_info: OAFileInfo) -> Dict:
         """基础验证"""
         try:
@@ -176,7 +403,7 @@ class FileFilter:
             return {'is_valid': True}
 
         except Exception as e:
-            logger.error(f"基础验证失败: {e}")
+            logger.error("基础验证失败: %s", e)
             return {
                 'is_valid': False,
                 'reason': f'基础验证出错: {str(e)}'
@@ -205,13 +432,14 @@ class FileFilter:
             }
 
             # 记录检测结果
-            logger.info(f"文件类型检测: {file_info.imagefilename} -> {detected_type} "
-                       f"(置信度: {type_result['confidence']}%, 方法: {type_result['detection_method']})")
+            logger.info("文件类型检测: %s -> %s (置信度: %s%%, 方法: %s)",
+                        file_info.imagefilename, detected_type,
+                        type_result['confidence'], type_result['detection_method'])
 
             return result
 
         except Exception as e:
-            logger.error(f"文件类型检测失败: {e}")
+            logger.error("文件类型检测失败: %s", e)
             return {
                 'file_type': 'unknown',
                 'mime_type': 'application/octet-stream',
@@ -228,32 +456,41 @@ class FileFilter:
             if not filename:
                 return {'should_skip': False, 'matched_keywords': [], 'checked_keywords_types': []}
 
+            # 未命中时走快速路径直接返回；命中（或调试日志开启）时再收集命中明细
+            if not self.fast_check_keywords(filename, business_category) and not logger.isEnabledFor(logging.DEBUG):
+                checked_types = ['共用']
+                if business_category and business_category in self.business_category_keywords:
+                    checked_types.append(business_category.value)
+                return {
+                    'should_skip': False,
+                    'matched_keywords': [],
+                    'checked_keywords_types': checked_types,
+                    'business_category': business_category.value if business_category else 'unknown'
+                }
+
             # 根据配置决定是否大小写敏感
-            check_filename = filename if self.config['case_sensitive_keywords'] else filename.lower()
+            check_filename = filename if self._case_sensitive else filename.lower()
 
             matched_keywords = []
             checked_types = []
 
             # 1. 检查共用关键字（所有业务分类都检查）
-            for keyword in self.common_keywords:
-                check_keyword = keyword if self.config['case_sensitive_keywords'] else keyword.lower()
-                if check_keyword in check_filename:
-                    matched_keywords.append(f"{keyword}(共用)")
+            for keyword in self._match_keywords(self._ac_common, self.common_keywords_lc, check_filename):
+                matched_keywords.append(f"{keyword}(共用)")
             checked_types.append('共用')
 
             # 2. 检查特定业务分类的关键字
             if business_category and business_category in self.business_category_keywords:
-                specific_keywords = self.business_category_keywords[business_category]
-                for keyword in specific_keywords:
-                    check_keyword = keyword if self.config['case_sensitive_keywords'] else keyword.lower()
-                    if check_keyword in check_filename:
-                        matched_keywords.append(f"{keyword}({business_category.value})")
+                specific_keywords = self.business_category_keywords_lc[business_category]
+                automaton = self._ac_by_category.get(business_category)
+                for keyword in self._match_keywords(automaton, specific_keywords, check_filename):
+                    matched_keywords.append(f"{keyword}({business_category.value})")
                 checked_types.append(business_category.value)
 
             should_skip = len(matched_keywords) > 0
 
             if should_skip:
-                logger.info(f"文件名关键字筛选: {filename} 匹配关键字 {matched_keywords}，跳过处理")
+                logger.info("文件名关键字筛选: %s 匹配关键字 %s，跳过处理", filename, matched_keywords)
 
             return {
                 'should_skip': should_skip,
@@ -263,7 +500,7 @@ class FileFilter:
             }
 
         except Exception as e:
-            logger.error(f"关键字检查失败: {e}")
+            logger.error("关键字检查失败: %s", e)
             return {
                 'should_skip': False,
                 'matched_keywords': [],
@@ -271,77 +508,83 @@ class FileFilter:
                 'error': str(e)
             }
 
-    def _check_duplicate(self, file_info: OAFileInfo) -> Dict:
-        """检查重复文件"""
-        try:
-            db = get_db_session()
+    def _check_duplicate(self, file_info: OAFileInfo, db: Session = None) -> Dict:
+        """
+        检查重复文件（已完成或正在处理）
+
+        已有内容哈希（曾下载过）时按内容哈希判断；否则在下载前按 同名同大小 快速判断
+        """
+        if file_info.content_sha256:
+            return self.check_content_duplicate(file_info, file_info.content_sha256, db)
+
+        # 没有大小信息时无法判断同大小，不视为重复
+        if not file_info.filesize:
+            return {
+                'is_duplicate': False,
+                'reason': '',
+                'duplicate_files': []
+            }
 
-            # 查找同名文件，排除当前文件
-            duplicate_query = db.query(OAFileInfo).filter(
-                and_(
+        try:
+            if file_info.imagefilename in self._dup_prefetched_names:
+                # 已批量预取，直接在内存中查找
+                duplicate = next((
+                    row for row in self._dup_cache.get((file_info.imagefilename, file_info.filesize), [])
+                    if row.imagefileid != file_info.imagefileid
+                ), None)
+            elif db is None:
+                with session_scope() as db:
+                    duplicate = self._query_duplicate(
+                        db, file_info,
+                        OAFileInfo.imagefilename == file_info.imagefilename,
+                        OAFileInfo.filesize == file_info.filesize
+                    )
+            else:
+                duplicate = self._query_duplicate(
+                    db, file_info,
                     OAFileInfo.imagefilename == file_info.imagefilename,
-                    OAFileInfo.imagefileid != file_info.imagefileid
+                    OAFileInfo.filesize == file_info.filesize
                 )
-            )
 
-            duplicates = duplicate_query.all()
+            if duplicate and logger.isEnabledFor(logging.INFO):
+                logger.info("发现重复文件: %s (大小: %s) 状态: %s",
+                            file_info.imagefilename, format_file_size(file_info.filesize),
+                            duplicate.processing_status.value)
+            return self._duplicate_result(duplicate, '同名同大小文件已存在')
 
-            if not duplicates:
-                db.close()
-                return {
-                    'is_duplicate': False,
-                    'reason': '',
-                    'duplicate_files': []
-                }
-
-            # 检查是否存在已完成或正在处理的同名同大小文件
-            for duplicate in duplicates:
-                # 检查处理状态 - 包含所有正在处理和已完成的状态
-                if duplicate.processing_status in [
-                    ProcessingStatus.DOWNLOADING,
-                    ProcessingStatus.DECRYPTING,
-                    ProcessingStatus.PARSING,
-                    ProcessingStatus.ANALYZING,
-                    ProcessingStatus.AWAITING_APPROVAL,
-                    ProcessingStatus.COMPLETED,
-                    ProcessingStatus.SKIPPED
-                ]:
-                    # 检查文件大小是否相同
-                    if duplicate.filesize and file_info.filesize and duplicate.filesize == file_info.filesize:
-                        db.close()
-                        logger.info(f"发现重复文件: {file_info.imagefilename} "
-                                   f"(大小: {format_file_size(file_info.filesize)}) "
-                                   f"状态: {duplicate.processing_status.value}")
-                        return {
-                            'is_duplicate': True,
-                            'reason': f'同名同大小文件已存在 (状态: {duplicate.processing_status.value})',
-                            'duplicate_files': [{
-                                'id': duplicate.imagefileid,
-                                'filename': duplicate.imagefilename,
-                                'size': duplicate.filesize,
-                                'status': duplicate.processing_status.value,
-                                'created_at': duplicate.created_at.isoformat() if duplicate.created_at else None
-                            }]
-                        }
-
-            db.close()
-
-            # 存在同名文件但大小不同或状态不同，不算重复
+        except Exception as e:
+            logger.error("重复文件检查失败: %s", e)
             return {
                 'is_duplicate': False,
-                'reason': '存在同名文件但大小或状态不同',
-                'duplicate_files': [{
-                    'id': dup.imagefileid,
-                    'filename': dup.imagefilename,
-                    'size': dup.filesize,
-                    'status': dup.processing_status.value
-                } for dup in duplicates]
+                'reason': f'重复检查出错: {str(e)}',
+                'duplicate_files': [],
+                'error': str(e)
             }
 
+    def check_content_duplicate(self, file_info: OAFileInfo, content_sha256: str, db: Session = None) -> Dict:
+        """
+        按文件内容SHA256检查重复文件（下载后调用，可识别改名后的相同文件）
+
+        Args:
+            file_info: 文件信息对象
+            content_sha256: 文件内容的SHA256十六进制摘要
+            db: 数据库会话（可选）
+        """
+        try:
+            if db is None:
+                with session_scope() as db:
+                    duplicate = self._query_duplicate(db, file_info, OAFileInfo.content_sha256 == content_sha256)
+            else:
+                duplicate = self._query_duplicate(db, file_info, OAFileInfo.content_sha256 == content_sha256)
+
+            if duplicate:
+                logger.info("发现内容重复文件: %s 与 %s (%s) 内容相同，状态: %s",
+                            file_info.imagefilename, duplicate.imagefilename,
+                            duplicate.imagefileid, duplicate.processing_status.value)
+            return self._duplicate_result(duplicate, '相同内容文件已存在')
+
         except Exception as e:
-            logger.error(f"重复文件检查失败: {e}")
-            if 'db' in locals():
-                db.close()
+            logger.error("内容重复检查失败: %s", e)
             return {
                 'is_duplicate': False,
                 'reason': f'重复检查出错: {str(e)}',
@@ -349,6 +592,43 @@ class FileFilter:
                 'error': str(e)
             }
 
+    @staticmethod
+    def _duplicate_result(duplicate, reason: str) -> Dict:
+        """构造重复检查结果"""
+        if not duplicate:
+            return {
+                'is_duplicate': False,
+                'reason': '',
+                'duplicate_files': []
+            }
+
+        return {
+            'is_duplicate': True,
+            'reason': f'{reason} (状态: {duplicate.processing_status.value})',
+            'duplicate_files': [{
+                'id': duplicate.imagefileid,
+                'filename': duplicate.imagefilename,
+                'size': duplicate.filesize,
+                'status': duplicate.processing_status.value,
+                'created_at': duplicate.created_at.isoformat() if duplicate.created_at else None
+            }]
+        }
+
+    @staticmethod
+    def _query_duplicate(db: Session, file_info: OAFileInfo, *criteria):
+        """按给定条件查找处于处理中或已完成状态的文件，排除当前文件，命中一条即可"""
+        return db.query(
+            OAFileInfo.imagefileid,
+            OAFileInfo.imagefilename,
+            OAFileInfo.filesize,
+            OAFileInfo.processing_status,
+            OAFileInfo.created_at
+        ).filter(
+            *criteria,
+            OAFileInfo.imagefileid != file_info.imagefileid,
+            OAFileInfo.processing_status.in_(DUPLICATE_STATUSES)
+        ).first()
+
     def _check_file_size(self, file_info: OAFileInfo) -> Dict:
         """检查文件大小"""
         try:
@@ -361,24 +641,23 @@ class FileFilter:
             file_size = file_info.filesize
 
             # 检查最小大小
-            if file_size < self.config['min_file_size_bytes']:
+            if file_size < self._min_file_size_bytes:
                 return {
                     'is_valid': False,
-                    'reason': f'文件太小 ({format_file_size(file_size)} < {format_file_size(self.config["min_file_size_bytes"])})'
+                    'reason': f'文件太小 ({format_file_size(file_size)} < {format_file_size(self._min_file_size_bytes)})'
                 }
 
             # 检查最大大小
-            max_size_bytes = self.config['max_file_size_mb'] * 1024 * 1024
-            if file_size > max_size_bytes:
+            if file_size > self._max_file_size_bytes:
                 return {
                     'is_valid': False,
-                    'reason': f'文件太大 ({format_file_size(file_size)} > {format_file_size(max_size_bytes)})'
+                    'reason': f'文件太大 ({format_file_size(file_size)} > {format_file_size(self._max_file_size_bytes)})'
                 }
 
             return {'is_valid': True}
 
         except Exception as e:
-            logger.error(f"文件大小检查失败: {e}")
+            logger.error("文件大小检查失败: %s", e)
             return {
                 'is_valid': True,  # 出错时允许通过，避免误判
                 'reason': f'大小检查出错: {str(e)}'
@@ -389,33 +668,17 @@ class FileFilter:
         if not filename:
             return 'other'
 
-        # 提取文件扩展名
-        import os
-        _, ext = os.path.splitext(filename.lower())
-        ext = ext.lstrip('.')
-
-        # 映射文件扩展名到类型
-        extension_mapping = {
-            'pdf': 'pdf',
-            'doc': 'doc',
-            'docx': 'docx',
-            'txt': 'txt',
-            'text': 'txt',
-            'log': 'txt',
-            'html': 'other',
-            'htm': 'other',
-            'xml': 'other',
-            'rtf': 'other',
-            'xls': 'other',
-            'xlsx': 'other',
-            'ppt': 'other',
-            'pptx': 'other',
-        }
-
-        return extension_mapping.get(ext, 'other')
+        ext = os.path.splitext(filename)[1].lower().lstrip('.')
+        return EXTENSION_TYPE_MAP.get(ext, 'other')
 
     def get_keywords_summary(self) -> Dict:
-        """获取关键字配置摘要"""
+        """获取关键字配置摘要（关键字变更前复用缓存结果）"""
+        if self._keywords_summary_cache is None:
+            self._keywords_summary_cache = self._build_keywords_summary()
+        return self._keywords_summary_cache
+
+    def _build_keywords_summary(self) -> Dict:
+        """构建关键字配置摘要"""
         return {
             'common_keywords': self.common_keywords,
             'business_category_keywords': {k.value: v for k, v in self.business_category_keywords.items()},
@@ -428,55 +691,69 @@ class FileFilter:
     def update_config(self, config_updates: Dict):
         """更新配置"""
         self.config.update(config_updates)
-        logger.info(f"已更新筛选器配置: {config_updates}")
+        self._apply_config()
+        if 'case_sensitive_keywords' in config_updates:
+            self._build_keyword_matchers()
+        self._keywords_summary_cache = None
+        logger.info("已更新筛选器配置: %s", config_updates)
 
     def get_filter_stats(self, limit: int = 100) -> Dict:
-        """获取筛选统计信息"""
+        """获取筛选统计信息（数据库统计部分按 limit 缓存 _stats_ttl 秒）"""
+        cached = self._stats_cache.get(limit)
+        if cached and time.monotonic() - cached[0] < self._stats_ttl:
+            stats = copy.deepcopy(cached[1])
+            stats['current_config'] = self.config
+            stats['keywords_summary'] = self.get_keywords_summary()
+            return stats
+
         try:
-            db = get_db_session()
-
-            # 统计各种状态的文件数量
-            total_files = db.query(OAFileInfo).filter(OAFileInfo.is_zw == True).count()
-            pending_files = db.query(OAFileInfo).filter(
-                and_(OAFileInfo.is_zw == True, OAFileInfo.processing_status == ProcessingStatus.PENDING)
-            ).count()
-            completed_files = db.query(OAFileInfo).filter(
-                and_(OAFileInfo.is_zw == True, OAFileInfo.processing_status == ProcessingStatus.COMPLETED)
-            ).count()
-            failed_files = db.query(OAFileInfo).filter(
-                and_(OAFileInfo.is_zw == True, OAFileInfo.processing_status == ProcessingStatus.FAILED)
-            ).count()
-            skipped_files = db.query(OAFileInfo).filter(
-                and_(OAFileInfo.is_zw == True, OAFileInfo.processing_status == ProcessingStatus.SKIPPED)
-            ).count()
-
-            # 获取最近的待处理文件示例
-            recent_pending = db.query(OAFileInfo).filter(
-                and_(OAFileInfo.is_zw == True, OAFileInfo.processing_status == ProcessingStatus.PENDING)
-            ).order_by(OAFileInfo.created_at.desc()).limit(limit).all()
-
-            db.close()
+            with session_scope() as db:
+                # 统计各种状态的文件数量（一次 GROUP BY 聚合）
+                status_counts = dict(db.query(
+                    OAFileInfo.processing_status, func.count(OAFileInfo.id)
+                ).filter(
+                    OAFileInfo.is_zw == True
+                ).group_by(OAFileInfo.processing_status).all())
+
+                total_files = sum(status_counts.values())
+                pending_files = status_counts.get(ProcessingStatus.PENDING, 0)
+                completed_files = status_counts.get(ProcessingStatus.COMPLETED, 0)
+                failed_files = status_counts.get(ProcessingStatus.FAILED, 0)
+                skipped_files = status_counts.get(ProcessingStatus.SKIPPED, 0)
+
+                # 获取最近的待处理文件示例
+                recent_pending = db.query(OAFileInfo).filter(
+                    and_(OAFileInfo.is_zw == True, OAFileInfo.processing_status == ProcessingStatus.PENDING)
+                ).order_by(OAFileInfo.created_at.desc()).limit(limit).all()
+
+                recent_pending_files = [{
+                    'id': f.imagefileid,
+                    'filename': f.imagefilename,
+                    'size': f.filesize,
+                    'business_category': f.business_category.value if f.business_category else 'unknown',
+                    'created_at': f.created_at.isoformat() if f.created_at else None
+                } for f in recent_pending]
 
-            return {
+            stats = {
                 'total_files': total_files,
                 'pending_files': pending_files,
                 'completed_files': completed_files,
                 'failed_files': failed_files,
                 'skipped_files': skipped_files,
                 'processing_rate': round((completed_files / total_files * 100), 2) if total_files > 0 else 0,
-                'recent_pending_files': [{
-                    'id': f.imagefileid,
-                    'filename': f.imagefilename,
-                    'size': f.filesize,
-                    'business_category': f.business_category.value if f.business_category else 'unknown',
-                    'created_at': f.created_at.isoformat() if f.created_at else None
-                } for f in recent_pending],
-                'current_config': self.config,
-                'keywords_summary': self.get_keywords_summary()
+                'recent_pending_files': recent_pending_files
             }
+            if self._stats_ttl > 0:
+                if len(self._stats_cache) >= 16:
+                    self._stats_cache.clear()
+                self._stats_cache[limit] = (time.monotonic(), copy.deepcopy(stats))
+
+            stats['current_config'] = self.config
+            stats['keywords_summary'] = self.get_keywords_summary()
+            return stats
 
         except Exception as e:
-            logger.error(f"获取筛选统计失败: {e}")
+            logger.error("获取筛选统计失败: %s", e)
             return {
                 'error': str(e),
                 'current_config': self.config,
@@ -484,5 +761,23 @@ class FileFilter:
             }
 
 
-# 创建全局筛选器实例
-file_filter = FileFilter()
\ No newline at end of file
+# 全局筛选器实例（首次使用时创建）
+_file_filter: Optional[FileFilter] = None
+_file_filter_lock = threading.Lock()
+
+
+def get_file_filter() -> FileFilter:
+    """获取全局筛选器实例，首次调用时加载配置并创建"""
+    global _file_filter
+    if _file_filter is None:
+        with _file_filter_lock:
+            if _file_filter is None:
+                _file_filter = FileFilter()
+    return _file_filter
+
+
+def __getattr__(name: str):
+    # 兼容 `from services.file_filter import file_filter` 的写法
+    if name == 'file_filter':
+        return get_file_filter()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
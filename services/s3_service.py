@@ -1,16 +1,29 @@
 import boto3
+from botocore.config import Config
 from botocore.exceptions import ClientError, NoCredentialsError
 from config import settings
 import logging
-from typing import Optional
+from typing import Optional, Tuple
+from utils.cache_utils import TTLCache
 
 logger = logging.getLogger(__name__)
 
 class S3Service:
     """S3存储服务"""
     
+    # 文件元信息/存在性缓存，避免对同一文件重复发起 HEAD 请求
+    INFO_CACHE_SIZE = 4096
+    INFO_CACHE_TTL = 300
+    MISSING_CACHE_TTL = 30  # 不存在的结果只短暂缓存，避免文件上传后长时间查不到
+
+    # 健康检查客户端的连接/读取超时（秒）
+    PROBE_CONNECT_TIMEOUT = 2
+    PROBE_READ_TIMEOUT = 2
+
     def __init__(self):
         self.client = None
+        self._info_cache = TTLCache(maxsize=self.INFO_CACHE_SIZE, ttl=self.INFO_CACHE_TTL)
+        self._exists_cache = TTLCache(maxsize=self.INFO_CACHE_SIZE, ttl=self.INFO_CACHE_TTL)
         self._init_client()
     
     def _init_client(self):
@@ -22,22 +35,7 @@ class S3Service:
                 self.client = None
                 return
             
-            session = boto3.Session(
-                aws_access_key_id=settings.s3_access_key,
-                aws_secret_access_key=settings.s3_secret_key,
-                region_name=settings.s3_region
-            )
-            
-            client_kwargs = {}
-            if settings.s3_endpoint_url:
-                # 确保endpoint URL格式正确
-                endpoint_url = settings.s3_endpoint_url.strip()
-                if not endpoint_url.startswith('http'):
-                    endpoint_url = f'https://{endpoint_url}'
-                client_kwargs['endpoint_url'] = endpoint_url
-                logger.info(f"使用自定义S3端点: {endpoint_url}")
-            
-            self.client = session.client('s3', **client_kwargs)
+            self.client = self._create_client(self._build_client_config())
             logger.info("S3客户端初始化成功")
             
         except NoCredentialsError:
@@ -47,12 +45,65 @@ class S3Service:
             logger.warning(f"S3客户端初始化失败: {e}, S3服务不可用")
             self.client = None
     
-    def download_file(self, token_key: str) -> bytes:
+    @staticmethod
+    def _create_client(config: Config):
+        """按当前S3配置创建客户端"""
+        session = boto3.Session(
+            aws_access_key_id=settings.s3_access_key,
+            aws_secret_access_key=settings.s3_secret_key,
+            region_name=settings.s3_region
+        )
+
+        client_kwargs = {}
+        if settings.s3_endpoint_url:
+            # 确保endpoint URL格式正确
+            endpoint_url = settings.s3_endpoint_url.strip()
+            if not endpoint_url.startswith('http'):
+                endpoint_url = f'https://{endpoint_url}'
+            client_kwargs['endpoint_url'] = endpoint_url
+            logger.info(f"使用自定义S3端点: {endpoint_url}")
+
+        return session.client('s3', config=config, **client_kwargs)
+
+    def create_probe_client(self):
+        """
+        创建健康检查专用客户端：短超时且不重试，S3不可达时快速失败，
+        不占用主客户端的连接池和重试预算
+        """
+        if not settings.s3_access_key or not settings.s3_secret_key:
+            return None
+        return self._create_client(Config(
+            connect_timeout=self.PROBE_CONNECT_TIMEOUT,
+            read_timeout=self.PROBE_READ_TIMEOUT,
+            retries={'mode': 'standard', 'total_max_attempts': 1}
+        ))
+
+    @staticmethod
+    def _build_client_config() -> Config:
+        """
+        S3客户端连接配置：开启TCP keepalive，并放大连接池以支持并发下载；
+        使用自适应重试，在限流或瞬时网络错误时自动退避重试
+        """
+        return Config(
+            connect_timeout=10,
+            read_timeout=60,
+            tcp_keepalive=True,
+            max_pool_connections=getattr(settings, 's3_max_pool_connections', 50),
+            retries={'mode': 'adaptive', 'max_attempts': 5}
+        )
+
+    @staticmethod
+    def _err_code(e: ClientError) -> str:
+        """提取S3错误码，响应中缺少错误信息时返回空字符串"""
+        return e.response.get('Error', {}).get('Code', '')
+
+    def download_file(self, token_key: str, byte_range: Optional[Tuple[int, int]] = None) -> bytes:
         """
         从S3下载文件
         
         Args:
             token_key: OSS下载key，文件在S3中的键值
+            byte_range: 只下载指定的字节范围 (起始, 结束)，闭区间（可选）
             
         Returns:
             文件的二进制数据
@@ -68,9 +119,11 @@ class S3Service:
                 'Key': token_key
             }
             
+            if byte_range is not None:
+                download_params['Range'] = f"bytes={byte_range[0]}-{byte_range[1]}"
+            
             logger.info(f"开始下载文件: {token_key}")
             
-            # 下载文件到内存
             response = self.client.get_object(**download_params)
             file_data = response['Body'].read()
             
@@ -78,13 +131,13 @@ class S3Service:
             return file_data
             
         except ClientError as e:
-            error_code = e.response['Error']['Code']
+            error_code = self._err_code(e)
             if error_code == 'NoSuchKey':
-                logger.error(f"文件不存在: {file_key}")
-                raise FileNotFoundError(f"文件不存在: {file_key}")
+                logger.error(f"文件不存在: {token_key}")
+                raise FileNotFoundError(f"文件不存在: {token_key}")
             elif error_code == 'AccessDenied':
-                logger.error(f"访问被拒绝: {file_key}")
-                raise PermissionError(f"访问被拒绝: {file_key}")
+                logger.error(f"访问被拒绝: {token_key}")
+                raise PermissionError(f"访问被拒绝: {token_key}")
             else:
                 logger.error(f"S3下载错误 {error_code}: {e}")
                 raise
@@ -98,11 +151,23 @@ class S3Service:
             logger.error("S3客户端未初始化，无法检查文件")
             return False
             
+        exists = self._exists_cache.get(token_key)
+        if exists is not None:
+            return exists
+
         try:
             self.client.head_object(Bucket=settings.s3_bucket_name, Key=token_key)
-            return True
-        except ClientError:
-            return False
+            exists = True
+        except ClientError as e:
+            error_code = self._err_code(e)
+            if error_code not in ('404', 'NoSuchKey', 'NotFound'):
+                # 限流、权限或瞬时服务端错误不代表文件不存在，不缓存该结果
+                logger.warning(f"检查文件是否存在失败 {error_code}: {token_key}")
+                return False
+            exists = False
+
+        self._exists_cache.set(token_key, exists, ttl=None if exists else self.MISSING_CACHE_TTL)
+        return exists
     
     def get_file_info(self, token_key: str) -> dict:
         """获取文件信息"""
@@ -110,17 +175,29 @@ class S3Service:
             logger.error("S3客户端未初始化，无法获取文件信息")
             raise RuntimeError("S3服务不可用")
             
+        cached = self._info_cache.get(token_key)
+        if cached is not None:
+            return dict(cached)
+
         try:
             response = self.client.head_object(Bucket=settings.s3_bucket_name, Key=token_key)
-            return {
+            file_info = {
                 'size': response['ContentLength'],
                 'last_modified': response['LastModified'],
                 'content_type': response.get('ContentType', 'unknown'),
                 'etag': response['ETag']
             }
+            self._info_cache.set(token_key, file_info)
+            self._exists_cache.set(token_key, True)
+            return dict(file_info)
         except ClientError as e:
             logger.error(f"获取文件信息失败: {e}")
             raise
 
+    def clear_cache(self):
+        """清空文件元信息缓存"""
+        self._info_cache.clear()
+        self._exists_cache.clear()
+
 # 创建全局实例
 s3_service = S3Service()
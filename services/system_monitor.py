@@ -1,26 +1,147 @@
+import copy
+import functools
+import json
 import logging
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, wait
 from datetime import datetime
-from typing import Any, Dict, List, Optional
+from operator import itemgetter
+from typing import Any, Callable, Collection, Dict, List, Mapping, Optional
 
 from botocore.exceptions import BotoCoreError, ClientError
-from redis import Redis
+from redis import ConnectionPool, Redis
 from redis.exceptions import RedisError
-from sqlalchemy import func, text
+from sqlalchemy import Integer, String, bindparam, case, cast, func, literal, null, select, text, union_all
 from sqlalchemy.exc import SQLAlchemyError
 
 from config import settings
-from database import SessionLocal, engine
+from database import engine
 from models import OAFileInfo, ProcessingLog, ProcessingStatus
 from services.dify_service import dify_service
 from services.s3_service import s3_service
+from utils.cache_utils import TTLCache
 
 logger = logging.getLogger(__name__)
 
+try:
+    from tasks.document_processor import app as _celery_app
+except Exception as exc:  # pragma: no cover - defensive
+    logger.warning("Celery app unavailable for health checks: %s", exc)
+    _celery_app = None
+
+_celery_inspectors: Dict[float, Any] = {}
+
+
+def _get_celery_inspect(timeout: float) -> Any:
+    """Build one Inspect per timeout and reuse it across health checks."""
+    inspect = _celery_inspectors.get(timeout)
+    if inspect is None:
+        inspect = _celery_app.control.inspect(timeout=timeout)
+        _celery_inspectors[timeout] = inspect
+    return inspect
+
+
+_HEALTH_CACHE_TTL = getattr(settings, "health_cache_ttl", 5)
+_health_cache = TTLCache(maxsize=64, ttl=_HEALTH_CACHE_TTL)
+
+
+def _ttl_cache(func: Optional[Callable] = None, *, ttl: Optional[int] = None) -> Callable:
+    """Cache a read-only probe result in-process, for HEALTH_CACHE_TTL seconds unless ttl is given."""
+
+    def decorator(fn: Callable) -> Callable:
+        seconds = _HEALTH_CACHE_TTL if ttl is None else ttl
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if seconds <= 0:
+                return fn(*args, **kwargs)
+            key = (fn.__name__, args, tuple(sorted(kwargs.items())))
+            cached = _health_cache.get(key)
+            if cached is None:
+                cached = fn(*args, **kwargs)
+                _health_cache.set(key, cached, ttl=seconds)
+            return copy.deepcopy(cached)
+
+        wrapper.cache_clear = _health_cache.clear
+        return wrapper
+
+    return decorator(func) if func is not None else decorator
+
 
 def _normalize_exception(exc: Exception) -> str:
     return str(exc)
 
 
+# Probes are I/O bound and independent, so they run side by side on a shared pool.
+_probe_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="health-probe")
+# The engine uses a StaticPool (one shared connection), so database probes run in order on one thread.
+_db_probe_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="health-probe-db")
+_PROBE_TIMEOUT = 10
+_PROBE_DEADLINE = getattr(settings, "health_probe_deadline_ms", 800) / 1000
+
+# A probe that outlives its deadline keeps its thread; later callers reuse its future instead of queueing another.
+_pending_probes: Dict[str, Future] = {}
+_pending_probes_lock = threading.Lock()
+
+
+def _probe_fallback(fallback: Any, error: str) -> Any:
+    result = copy.deepcopy(fallback)
+    if isinstance(result, dict):
+        result["error"] = error
+    return result
+
+
+def _forget_probe(name: str, future: Future) -> None:
+    with _pending_probes_lock:
+        if _pending_probes.get(name) is future:
+            del _pending_probes[name]
+
+
+def _submit_probe(name: str, probe: Callable[[], Any], executor: ThreadPoolExecutor) -> Future:
+    """Return the probe's in-flight future if it has one, otherwise submit it."""
+    with _pending_probes_lock:
+        future = _pending_probes.get(name)
+        if future is not None:
+            return future
+        future = executor.submit(probe)
+        _pending_probes[name] = future
+    future.add_done_callback(functools.partial(_forget_probe, name))
+    return future
+
+
+def _run_probes(
+    probes: Dict[str, Callable[[], Any]],
+    fallbacks: Dict[str, Any],
+    deadline: float = _PROBE_TIMEOUT,
+    db_probes: Collection[str] = (),
+) -> Dict[str, Any]:
+    """Run probes concurrently; a failed probe, or one unfinished at the deadline, yields its fallback.
+
+    Probe names are global: a name still running from an earlier call is awaited, not started again.
+    Probes listed in db_probes run in the given order on the single database thread.
+    """
+    futures = {
+        name: _submit_probe(name, probe, _db_probe_executor if name in db_probes else _probe_executor)
+        for name, probe in probes.items()
+    }
+    wait(futures.values(), timeout=deadline)
+    results: Dict[str, Any] = {}
+    for name, future in futures.items():
+        if not future.done():
+            # The probe keeps running and still fills its TTL cache for the next snapshot.
+            logger.warning("Health probe %s missed the %.1fs deadline", name, deadline)
+            results[name] = _probe_fallback(fallbacks[name], "timeout")
+            continue
+        try:
+            results[name] = future.result()
+        except Exception as exc:
+            logger.warning("Health probe %s failed: %s", name, exc)
+            results[name] = _probe_fallback(fallbacks[name], _normalize_exception(exc))
+    return results
+
+
+@_ttl_cache
 def check_database_connection() -> Dict[str, Any]:
     """Run a lightweight database connectivity check."""
     try:
@@ -32,37 +153,61 @@ def check_database_connection() -> Dict[str, Any]:
         return {"connected": False, "error": _normalize_exception(exc)}
 
 
-def check_redis_connection() -> Dict[str, Any]:
-    """Ping Redis and return basic metrics."""
-    client: Optional[Redis] = None
-    try:
-        client = Redis.from_url(
+_redis_pool: Optional[ConnectionPool] = None
+_REDIS_PROBE_INTERVAL = getattr(settings, "redis_probe_interval", 10)
+_redis_last_ok_at = 0.0
+_redis_last_result: Optional[Dict[str, Any]] = None
+
+
+def _get_redis_client() -> Redis:
+    """Return a client backed by a shared, lazily created connection pool."""
+    global _redis_pool
+    if _redis_pool is None:
+        _redis_pool = ConnectionPool.from_url(
             settings.redis_url,
             socket_connect_timeout=3,
             socket_timeout=3,
+            socket_keepalive=True,
+            health_check_interval=30,
+            max_connections=16,
             decode_responses=True,
         )
-        client.ping()
-        server_info = client.info(section="server")
-        memory_info = client.info(section="memory")
-        return {
+    return Redis(connection_pool=_redis_pool)
+
+
+def check_redis_connection() -> Dict[str, Any]:
+    """Ping Redis and return basic metrics."""
+    global _redis_last_ok_at, _redis_last_result
+    # A probe that succeeded moments ago is still a valid answer; skip the round-trips.
+    if _redis_last_result is not None and time.monotonic() - _redis_last_ok_at < _REDIS_PROBE_INTERVAL:
+        return dict(_redis_last_result)
+
+    try:
+        client = _get_redis_client()
+        # PING and both INFO sections go out in one round-trip.
+        with client.pipeline(transaction=False) as pipe:
+            pipe.ping()
+            pipe.info(section="server")
+            pipe.info(section="memory")
+            _, server_info, memory_info = pipe.execute()
+        result = {
             "connected": True,
             "version": server_info.get("redis_version"),
             "uptime": server_info.get("uptime_in_seconds"),
             "used_memory_human": memory_info.get("used_memory_human"),
         }
+        _redis_last_ok_at = time.monotonic()
+        _redis_last_result = result
+        return dict(result)
     except RedisError as exc:
         logger.warning("Redis connection check failed: %s", exc)
+        _redis_last_result = None
         return {"connected": False, "error": _normalize_exception(exc)}
-    finally:
-        if client:
-            try:
-                client.close()
-            except Exception:
-                pass
 
 
 def _ensure_s3_client() -> None:
+    # Diagnostics and storage stats share s3_service.client: its keep-alive connection pool (S3_MAX_POOL_CONNECTIONS)
+    # lets the concurrent snapshot probes run in parallel without reconnecting.
     if s3_service.client is None:
         try:
             s3_service._init_client()
@@ -70,13 +215,28 @@ def _ensure_s3_client() -> None:
             logger.warning("Failed to initialise S3 client: %s", exc)
 
 
+_s3_probe_client: Any = None
+
+
+def _get_s3_probe_client() -> Any:
+    """Connectivity checks use their own short-timeout, no-retry client so an unreachable S3 fails fast."""
+    global _s3_probe_client
+    if _s3_probe_client is None:
+        try:
+            _s3_probe_client = s3_service.create_probe_client()
+        except Exception as exc:  # pragma: no cover - defensive
+            logger.warning("Failed to initialise S3 probe client: %s", exc)
+    return _s3_probe_client
+
+
+@_ttl_cache(ttl=getattr(settings, "s3_probe_ttl", 10))
 def check_s3_connection() -> Dict[str, Any]:
     """Verify S3 connectivity by running head_bucket."""
-    _ensure_s3_client()
-    if not s3_service.client:
+    client = _get_s3_probe_client()
+    if not client:
         return {"connected": False, "error": "S3客户端未初始化"}
     try:
-        s3_service.client.head_bucket(Bucket=settings.s3_bucket_name)
+        client.head_bucket(Bucket=settings.s3_bucket_name)
         return {
             "connected": True,
             "bucket": settings.s3_bucket_name,
@@ -100,18 +260,17 @@ def run_s3_diagnostics(max_keys: int = 5) -> Dict[str, Any]:
             Bucket=settings.s3_bucket_name,
             MaxKeys=max_keys,
         )
-        keys = [obj.get("Key") for obj in response.get("Contents", [])]
+        contents = response.get("Contents", [])
+        keys = [obj.get("Key") for obj in contents]
         inspected = None
-        if keys:
-            head = s3_service.client.head_object(
-                Bucket=settings.s3_bucket_name,
-                Key=keys[0],
-            )
+        if contents:
+            # The listing already carries size and timestamp; no separate head_object needed.
+            first = contents[0]
             inspected = {
-                "key": keys[0],
-                "size": head.get("ContentLength"),
-                "last_modified": head.get("LastModified").isoformat()
-                if head.get("LastModified")
+                "key": first.get("Key"),
+                "size": first.get("Size"),
+                "last_modified": first.get("LastModified").isoformat()
+                if first.get("LastModified")
                 else None,
             }
         return {
@@ -128,42 +287,79 @@ def run_s3_diagnostics(max_keys: int = 5) -> Dict[str, Any]:
         return {"success": False, "error": _normalize_exception(exc)}
 
 
+# ListObjectsV2 always reports Size for every entry in Contents.
+_object_size = itemgetter("Size")
+
+
+_S3_STATS_TTL = getattr(settings, "s3_stats_ttl", 300)
+_S3_STATS_LOCK_SECONDS = 60
+_S3_STATS_WAIT_SECONDS = 3
+
+
 def get_s3_storage_stats(sample_size: int = 1000) -> Dict[str, Any]:
-    """Aggregate object counts and size for a sample window."""
+    """Aggregate object counts and size for a sample window, shared via Redis for S3_STATS_TTL seconds."""
+    if _S3_STATS_TTL <= 0:
+        return _compute_s3_storage_stats(sample_size)
+
+    key = f"s3:stats:{settings.s3_bucket_name}:{sample_size}"
+    try:
+        client = _get_redis_client()
+        cached = client.get(key)
+        if cached:
+            return json.loads(cached)
+
+        # Single-flight: only the lock holder lists the bucket; others briefly wait for its result.
+        if not client.set(f"{key}:lock", "1", nx=True, ex=_S3_STATS_LOCK_SECONDS):
+            deadline = time.monotonic() + _S3_STATS_WAIT_SECONDS
+            while time.monotonic() < deadline:
+                time.sleep(0.2)
+                cached = client.get(key)
+                if cached:
+                    return json.loads(cached)
+            return _compute_s3_storage_stats(sample_size)
+    except RedisError as exc:
+        logger.warning("S3 stats cache unavailable, computing directly: %s", exc)
+        return _compute_s3_storage_stats(sample_size)
+
+    stats = _compute_s3_storage_stats(sample_size)
+    try:
+        if stats.get("success"):
+            client.setex(key, _S3_STATS_TTL, json.dumps(stats))
+        client.delete(f"{key}:lock")
+    except RedisError as exc:
+        logger.warning("Failed to store S3 stats in cache: %s", exc)
+    return stats
+
+
+def _compute_s3_storage_stats(sample_size: int) -> Dict[str, Any]:
     _ensure_s3_client()
     if not s3_service.client:
         return {"success": False, "error": "S3客户端未初始化"}
     total_size = 0
     total_objects = 0
-    scanned = 0
-    continuation: Optional[str] = None
-    last_response: Optional[Dict[str, Any]] = None
+    has_more = False
     try:
-        while scanned < sample_size:
-            params: Dict[str, Any] = {
-                "Bucket": settings.s3_bucket_name,
-                "MaxKeys": min(1000, sample_size - scanned),
-            }
-            if continuation:
-                params["ContinuationToken"] = continuation
-            response = s3_service.client.list_objects_v2(**params)
-            last_response = response
-            contents = response.get("Contents", [])
-            batch_count = len(contents)
-            total_objects += batch_count
-            scanned += batch_count
-            total_size += sum(obj.get("Size", 0) for obj in contents)
-            if not response.get("IsTruncated"):
-                break
-            continuation = response.get("NextContinuationToken")
+        paginator = s3_service.client.get_paginator("list_objects_v2")
+        pages = paginator.paginate(
+            Bucket=settings.s3_bucket_name,
+            FetchOwner=False,
+            PaginationConfig={"MaxItems": sample_size, "PageSize": min(1000, sample_size)},
+        )
+        for page in pages:
+            contents = page.get("Contents", [])
+            total_objects += len(contents)
+            total_size += sum(map(_object_size, contents))
+            has_more = bool(page.get("IsTruncated"))
+        # MaxItems may cut the final page short; the paginator then leaves a resume token.
+        has_more = has_more or bool(pages.resume_token)
         return {
             "success": True,
             "bucket": settings.s3_bucket_name,
             "object_count_sample": total_objects,
             "total_size_bytes_sample": total_size,
-            "sample_complete": bool(last_response and not last_response.get("IsTruncated")),
-            "scanned_objects": scanned,
-            "has_more": bool(last_response and last_response.get("IsTruncated")),
+            "sample_complete": not has_more,
+            "scanned_objects": total_objects,
+            "has_more": has_more,
         }
     except ClientError as exc:
         error = exc.response.get("Error", {})
@@ -173,160 +369,243 @@ def get_s3_storage_stats(sample_size: int = 1000) -> Dict[str, Any]:
         return {"success": False, "error": _normalize_exception(exc)}
 
 
-def check_celery_health(timeout: int = 2) -> Dict[str, Any]:
-    """Inspect Celery workers using control API."""
+_CELERY_CONNECT_TIMEOUT = 2
+# The snapshot's ping has to answer within the probe deadline.
+_CELERY_PING_TIMEOUT = _PROBE_DEADLINE / 2
+
+
+@_ttl_cache
+def check_celery_health(timeout: float = 2, detailed: bool = False) -> Dict[str, Any]:
+    """Check Celery workers: a single ping broadcast, plus task counts when detailed."""
+    if _celery_app is None:
+        return {"connected": False, "error": "无法连接到Celery"}
     try:
-        from tasks.document_processor import app as celery_app
+        # No reply limit: every worker that answers within the timeout is listed.
+        with _celery_app.connection_for_write(connect_timeout=_CELERY_CONNECT_TIMEOUT) as connection:
+            # A broker that is down fails the probe at once instead of being retried.
+            connection.ensure_connection(max_retries=0)
+            replies = _celery_app.control.ping(timeout=timeout, connection=connection) or []
+        workers = [name for reply in replies for name in reply]
+        if not workers:
+            return {"connected": False, "error": "未检测到Celery工作进程"}
 
-        inspect = celery_app.control.inspect(timeout=timeout)
+        result: Dict[str, Any] = {"connected": True, "workers": workers}
+        if not detailed:
+            return result
+
+        inspect = _get_celery_inspect(timeout)
         if not inspect:
             return {"connected": False, "error": "无法连接到Celery"}
 
-        stats = inspect.stats() or {}
         active = inspect.active() or {}
         reserved = inspect.reserved() or {}
         scheduled = inspect.scheduled() or {}
 
-        workers = list(stats.keys())
-        if not workers:
-            return {"connected": False, "error": "未检测到Celery工作进程"}
-
         def _total(tasks_map: Dict[str, List[Any]]) -> int:
             return sum(len(items) for items in tasks_map.values()) if tasks_map else 0
 
-        return {
-            "connected": True,
-            "workers": workers,
-            "active_tasks": _total(active),
-            "reserved_tasks": _total(reserved),
-            "scheduled_tasks": _total(scheduled),
-        }
+        result.update(
+            {
+                "active_tasks": _total(active),
+                "reserved_tasks": _total(reserved),
+                "scheduled_tasks": _total(scheduled),
+            }
+        )
+        return result
     except Exception as exc:
         logger.warning("Celery health check failed: %s", exc)
         return {"connected": False, "error": _normalize_exception(exc)}
 
 
+_EMPTY_QUEUE_STATS: Dict[str, int] = {
+    "total": 0,
+    "PENDING": 0,
+    "in_progress": 0,
+    "AWAITING_APPROVAL": 0,
+    "COMPLETED": 0,
+    "FAILED": 0,
+    "SKIPPED": 0,
+}
+
+
+# Statuses reported together as "in_progress".
+_IN_PROGRESS_STATUSES = (
+    ProcessingStatus.DOWNLOADING,
+    ProcessingStatus.DECRYPTING,
+    ProcessingStatus.PARSING,
+    ProcessingStatus.ANALYZING,
+)
+
+
+def _count_status(*statuses: ProcessingStatus):
+    """SUM(CASE WHEN processing_status IN (...) THEN 1 ELSE 0 END)"""
+    return func.coalesce(func.sum(case((OAFileInfo.processing_status.in_(statuses), 1), else_=0)), 0)
+
+
+_Q_QUEUE_STATISTICS = select(
+    func.count(OAFileInfo.id).label("total"),
+    _count_status(ProcessingStatus.PENDING).label("PENDING"),
+    _count_status(*_IN_PROGRESS_STATUSES).label("in_progress"),
+    _count_status(ProcessingStatus.AWAITING_APPROVAL).label("AWAITING_APPROVAL"),
+    _count_status(ProcessingStatus.COMPLETED).label("COMPLETED"),
+    _count_status(ProcessingStatus.FAILED).label("FAILED"),
+    _count_status(ProcessingStatus.SKIPPED).label("SKIPPED"),
+)
+
+
+@_ttl_cache
 def get_queue_statistics() -> Dict[str, int]:
     """Summarise pipeline status from OAFileInfo."""
-    session = SessionLocal()
     try:
-        rows = session.query(
-            OAFileInfo.processing_status,
-            func.count(OAFileInfo.id),
-        ).group_by(OAFileInfo.processing_status).all()
-        counts = {status.value if status else "unknown": count for status, count in rows}
-        in_progress = sum(
-            counts.get(state.value, 0)
-            for state in [
-                ProcessingStatus.DOWNLOADING,
-                ProcessingStatus.DECRYPTING,
-                ProcessingStatus.PARSING,
-                ProcessingStatus.ANALYZING,
-            ]
-        )
-        return {
-            "total": sum(counts.values()),
-            "PENDING": counts.get(ProcessingStatus.PENDING.value, 0),
-            "in_progress": in_progress,
-            "AWAITING_APPROVAL": counts.get(ProcessingStatus.AWAITING_APPROVAL.value, 0),
-            "COMPLETED": counts.get(ProcessingStatus.COMPLETED.value, 0),
-            "FAILED": counts.get(ProcessingStatus.FAILED.value, 0),
-            "SKIPPED": counts.get(ProcessingStatus.SKIPPED.value, 0),
-        }
+        # Plain Core execution on a pooled connection: no Session or ORM result processing.
+        with engine.connect() as connection:
+            row = connection.execute(_Q_QUEUE_STATISTICS).one()
+        return {key: int(value or 0) for key, value in row._mapping.items()}
     except SQLAlchemyError as exc:
         logger.warning("Queue statistics query failed: %s", exc)
-        return {
-            "total": 0,
-            "PENDING": 0,
-            "in_progress": 0,
-            "AWAITING_APPROVAL": 0,
-            "COMPLETED": 0,
-            "FAILED": 0,
-            "SKIPPED": 0,
-            "error": _normalize_exception(exc),
-        }
-    finally:
-        session.close()
-
-
-def _format_log_entry(log: ProcessingLog) -> Dict[str, Any]:
-    return {
-        "id": log.id,
-        "file_id": log.file_id,
-        "step": log.step,
-        "status": log.status,
-        "message": log.message,
-        "duration_seconds": log.duration_seconds,
-        "created_at": log.created_at.isoformat() if isinstance(log.created_at, datetime) else None,
-    }
+        return {**_EMPTY_QUEUE_STATS, "error": _normalize_exception(exc)}
+
+
+_LOG_FIELDS = ("id", "file_id", "step", "status", "message", "duration_seconds")
+
+
+def _format_log_entry(row: Mapping[str, Any]) -> Dict[str, Any]:
+    entry = {field: row[field] for field in _LOG_FIELDS}
+    created_at = row["created_at"]
+    entry["created_at"] = created_at.isoformat() if isinstance(created_at, datetime) else None
+    return entry
+
+
+# Module-level statements select plain columns (no ORM entities to hydrate); they are
+# built once and their compiled form is reused from the engine's statement cache, with
+# only the bound limit changing per call.
+_LOG_COLUMNS = (
+    ProcessingLog.id.label("id"),
+    ProcessingLog.file_id.label("file_id"),
+    ProcessingLog.step.label("step"),
+    ProcessingLog.status.label("status"),
+    ProcessingLog.message.label("message"),
+    ProcessingLog.duration_seconds.label("duration_seconds"),
+    ProcessingLog.created_at.label("created_at"),
+)
+
+# Failed step logs and files with recorded errors, mapped onto one column set and
+# merged newest-first in a single round-trip. Each branch is limited on its own
+# first so the database can stop early on its created_at / updated_at ordering.
+_RECENT_FAILED_LOGS = (
+    select(literal("log").label("source"), *_LOG_COLUMNS)
+    .where(ProcessingLog.status.in_(("failed", "FAILED")))
+    .order_by(ProcessingLog.created_at.desc())
+    .limit(bindparam("lim"))
+    .subquery()
+)
+_RECENT_ERROR_FILES = (
+    select(
+        literal("file").label("source"),
+        cast(null(), Integer).label("id"),
+        OAFileInfo.imagefileid.label("file_id"),
+        cast(null(), String).label("step"),
+        literal("failed").label("status"),
+        OAFileInfo.last_error.label("message"),
+        cast(null(), Integer).label("duration_seconds"),
+        OAFileInfo.updated_at.label("created_at"),
+    )
+    .where(OAFileInfo.error_count > 0)
+    .order_by(OAFileInfo.updated_at.desc())
+    .limit(bindparam("lim"))
+    .subquery()
+)
+_RECENT_ERRORS_UNION = union_all(
+    select(*_RECENT_FAILED_LOGS.c),
+    select(*_RECENT_ERROR_FILES.c),
+).subquery()
+_Q_RECENT_ERRORS = (
+    select(_RECENT_ERRORS_UNION)
+    .order_by(_RECENT_ERRORS_UNION.c.created_at.desc())
+    .limit(bindparam("lim"))
+)
+_Q_RECENT_LOGS = (
+    select(*_LOG_COLUMNS)
+    .order_by(ProcessingLog.created_at.desc())
+    .limit(bindparam("lim"))
+)
 
 
 def get_recent_errors(limit: int = 5) -> List[Dict[str, Any]]:
-    session = SessionLocal()
     try:
-        logs = (
-            session.query(ProcessingLog)
-            .filter(ProcessingLog.status == "FAILED")
-            .order_by(ProcessingLog.created_at.desc())
-            .limit(limit)
-            .all()
-        )
-        if logs:
-            return [_format_log_entry(log) for log in logs]
-        files = (
-            session.query(OAFileInfo)
-            .filter(OAFileInfo.error_count > 0)
-            .order_by(OAFileInfo.updated_at.desc())
-            .limit(limit)
-            .all()
-        )
+        with engine.connect() as connection:
+            rows = connection.execute(_Q_RECENT_ERRORS, {"lim": limit}).mappings().all()
         results: List[Dict[str, Any]] = []
-        for item in files:
-            results.append(
-                {
-                    "file_id": item.imagefileid,
-                    "status": "failed",
-                    "message": item.last_error,
-                    "created_at": item.updated_at.isoformat() if isinstance(item.updated_at, datetime) else None,
-                }
-            )
+        for row in rows:
+            if row["source"] == "log":
+                results.append(_format_log_entry(row))
+            else:
+                created_at = row["created_at"]
+                results.append(
+                    {
+                        "file_id": row["file_id"],
+                        "status": row["status"],
+                        "message": row["message"],
+                        "created_at": created_at.isoformat() if isinstance(created_at, datetime) else None,
+                    }
+                )
         return results
     except SQLAlchemyError as exc:
         logger.warning("Recent errors query failed: %s", exc)
         return []
-    finally:
-        session.close()
 
 
 def get_recent_activity(limit: int = 10) -> List[Dict[str, Any]]:
-    session = SessionLocal()
     try:
-        logs = (
-            session.query(ProcessingLog)
-            .order_by(ProcessingLog.created_at.desc())
-            .limit(limit)
-            .all()
-        )
-        return [_format_log_entry(log) for log in logs]
+        with engine.connect() as connection:
+            rows = connection.execute(_Q_RECENT_LOGS, {"lim": limit}).mappings().all()
+        return [_format_log_entry(row) for row in rows]
     except SQLAlchemyError as exc:
         logger.warning("Recent activity query failed: %s", exc)
         return []
-    finally:
-        session.close()
 
 
+_dify_overview_last: Optional[Dict[str, Any]] = None
+
+
+def _connection_from_overview(dataset_info: Dict[str, Any]) -> Dict[str, Any]:
+    """Derive API reachability from the dataset overview's own HTTP results."""
+    kb_info = dataset_info.get("knowledge_base_info") or {}
+    if "dataset" in dataset_info or "document_total" in dataset_info:
+        return {
+            "success": True,
+            "error": None,
+            "message": f"API连接正常 (知识库: {kb_info.get('name', 'default')})",
+            "knowledge_base_name": kb_info.get("name", "default"),
+        }
+    error = (
+        dataset_info.get("error")
+        or dataset_info.get("dataset_error")
+        or dataset_info.get("documents_error")
+        or "未知错误"
+    )
+    return {"success": False, "error": error}
+
+
+@_ttl_cache(ttl=getattr(settings, "dify_overview_ttl", 30))
 def get_dify_overview() -> Dict[str, Any]:
+    global _dify_overview_last
     try:
-        connection = dify_service.check_api_connection()
+        # One overview fetch; a separate connection probe would hit the same API again.
         dataset_info = dify_service.get_dataset_overview()
-        return {
-            "connection": connection,
+        overview = {
+            "connection": _connection_from_overview(dataset_info),
             "dataset": dataset_info,
-            "document_total": dataset_info.get("total_documents") if dataset_info else None,
-            "pagination": dataset_info.get("pagination") if dataset_info else None,
+            "document_total": dataset_info.get("document_total"),
+            "pagination": dataset_info.get("pagination"),
         }
+        if overview["connection"]["success"]:
+            _dify_overview_last = overview
+        return overview
     except Exception as e:
         logger.error(f"获取Dify概览失败: {e}")
+        if _dify_overview_last is not None:
+            return {**_dify_overview_last, "stale": True}
         return {
             "connection": {"success": False, "error": str(e)},
             "dataset": None,
@@ -335,12 +614,56 @@ def get_dify_overview() -> Dict[str, Any]:
         }
 
 
-def get_system_snapshot() -> Dict[str, Any]:
-    """Aggregate subsystem checks for API consumption."""
-    db_status = check_database_connection()
-    redis_status = check_redis_connection()
-    s3_status = check_s3_connection()
-    celery_status = check_celery_health()
+# Last completed database statistics; a snapshot whose queries miss the deadline reports these instead.
+_db_stats_last: Dict[str, Any] = {
+    "queue": _EMPTY_QUEUE_STATS,
+    "recent_errors": [],
+    "recent_activity": [],
+}
+
+
+def _database_stats() -> Dict[str, Any]:
+    global _db_stats_last
+    stats = {
+        "queue": get_queue_statistics(),
+        "recent_errors": get_recent_errors(),
+        "recent_activity": get_recent_activity(),
+    }
+    _db_stats_last = stats
+    return stats
+
+
+@_ttl_cache
+def get_system_snapshot(detailed: bool = False) -> Dict[str, Any]:
+    """Aggregate subsystem checks for API consumption; detailed adds Celery task counts."""
+    disconnected = {"connected": False}
+    celery_probe = "celery_detailed" if detailed else "celery"
+    celery_timeout = 2 if detailed else _CELERY_PING_TIMEOUT
+    results = _run_probes(
+        {
+            # Submitted in this order to the database thread: connectivity first, then the slower statistics.
+            "database": check_database_connection,
+            "db_stats": _database_stats,
+            "redis": check_redis_connection,
+            "s3": check_s3_connection,
+            celery_probe: functools.partial(check_celery_health, timeout=celery_timeout, detailed=detailed),
+        },
+        {
+            "database": disconnected,
+            "db_stats": _db_stats_last,
+            "redis": disconnected,
+            "s3": disconnected,
+            celery_probe: disconnected,
+        },
+        # Detailed Celery inspection waits on several broadcasts; only the quick path gets the tight deadline.
+        deadline=_PROBE_TIMEOUT if detailed else _PROBE_DEADLINE,
+        db_probes=("database", "db_stats"),
+    )
+    db_status = results["database"]
+    db_stats = results["db_stats"]
+    redis_status = results["redis"]
+    s3_status = results["s3"]
+    celery_status = results[celery_probe]
 
     healthy_count = sum(1 for item in [db_status, redis_status, s3_status, celery_status] if item.get("connected"))
     if healthy_count >= 3:
@@ -356,12 +679,13 @@ def get_system_snapshot() -> Dict[str, Any]:
         "redis": redis_status,
         "s3": s3_status,
         "celery": celery_status,
-        "queue": get_queue_statistics(),
-        "recent_errors": get_recent_errors(),
-        "recent_activity": get_recent_activity(),
+        "queue": db_stats["queue"],
+        "recent_errors": db_stats["recent_errors"],
+        "recent_activity": db_stats["recent_activity"],
     }
 
 
+@_ttl_cache
 def get_s3_overview(include_stats: bool = True) -> Dict[str, Any]:
     status = check_s3_connection()
     diagnostics = None
@@ -384,8 +708,12 @@ def run_s3_full_diagnostics() -> Dict[str, Any]:
     status = check_s3_connection()
     if not status.get("connected"):
         return {"success": False, "error": status.get("error")}
-    diagnostics = run_s3_diagnostics()
-    stats = get_s3_storage_stats()
+    results = _run_probes(
+        {"s3_diagnostics": run_s3_diagnostics, "s3_stats": get_s3_storage_stats},
+        {"s3_diagnostics": {"success": False}, "s3_stats": {"success": False}},
+    )
+    diagnostics = results["s3_diagnostics"]
+    stats = results["s3_stats"]
     return {
         "success": diagnostics.get("success", False) and stats.get("success", False),
         "status": status,
@@ -394,6 +722,7 @@ def run_s3_full_diagnostics() -> Dict[str, Any]:
     }
 
 
+@_ttl_cache
 def get_ai_pipeline_summary() -> Dict[str, Any]:
     queue = get_queue_statistics()
     return {
@@ -1,10 +1,21 @@
 import re
 import json
+import hashlib
 import logging
-from datetime import datetime
-from typing import Dict, List, Optional, Tuple
+import threading
+import time
+from collections import namedtuple
+from functools import cached_property
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+from typing import Dict, Iterator, List, Optional, Tuple
+from sqlalchemy import JSON, Select, String, and_, cast, literal, or_, select, type_coerce, union_all, update
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.engine import Row
 from sqlalchemy.orm import Session
 from openai import OpenAI
+from redis import Redis
+from redis.exceptions import RedisError
 
 from models import OAFileInfo, ProcessingStatus, BusinessCategory
 from services.s3_service import s3_service
@@ -12,25 +23,201 @@ from services.decryption_service import decryption_service
 from services.api_document_parser import api_document_parser
 from services.dify_service import dify_service, multi_kb_manager
 from config import settings
+from utils.json_utils import json_loads
 
 logger = logging.getLogger(__name__)
 
 
+# Batch任务的终止状态
+BATCH_TERMINAL_STATUSES = ('completed', 'failed', 'expired', 'cancelled')
+
+# AI判断的固定指令放在system消息中，文档内容等变化部分放在最后的user消息中，
+# 使各次请求的前缀保持一致，便于服务端复用提示词缓存
+VERSION_COMPARE_SYSTEM_PROMPT = """你是一个专业的文档版本分析专家，擅长通过文档内容判断版本新旧。
+
+用户会给出若干个相似的文档，请判断哪个是最新版本。请仔细分析每个文档的内容预览，特别关注：
+1. 文档开头的发文号（例如：昆农商发【2025】xxx号）
+2. 文档中提到的版本号、修订日期等信息
+3. 文档名中的修订标识"""
+
+VERSION_COMPARE_OUTPUT_FORMAT = """请返回JSON格式的结果，包含以下字段：
+{
+    "latest_document_id": "最新版本文档的文件ID",
+    "reasoning": "判断理由",
+    "version_comparison": "版本对比说明",
+    "old_document_ids": ["旧版本文档的文件ID列表"]
+}"""
+
+EXPIRATION_SYSTEM_PROMPT = """你是一个专业的文档有效期分析专家，擅长判断文档是否过期。
+
+请根据用户给出的今天日期，分析文档是否已经过期。重点关注：
+1. 文档标题中的日期信息
+2. 文档内容中提到的时间区间、有效期
+3. 文档中的生效日期和失效日期"""
+
+EXPIRATION_OUTPUT_FORMAT = """请返回JSON格式的结果：
+{
+    "is_expired": true/false,
+    "reasoning": "判断理由",
+    "expiration_date": "过期日期（如果能找到）",
+    "confidence": 0-100
+}"""
+
+EXPIRATION_BATCH_SYSTEM_PROMPT = """你是一个专业的文档有效期分析专家，擅长判断文档是否过期。
+
+用户会给出今天的日期和以[序号]标记的多个文档，请逐一分析每个文档是否已经过期。重点关注：
+1. 文档标题中的日期信息
+2. 文档内容中提到的时间区间、有效期
+3. 文档中的生效日期和失效日期"""
+
+EXPIRATION_BATCH_OUTPUT_FORMAT = """请返回JSON格式的结果，results中每个文档一项，index为文档的序号：
+{
+    "results": [
+        {
+            "index": 1,
+            "is_expired": true/false,
+            "reasoning": "判断理由",
+            "expiration_date": "过期日期（如果能找到）",
+            "confidence": 0-100
+        }
+    ]
+}"""
+
+# 启用json_schema输出时使用的结构定义（此时不再在提示词中附带上面的JSON格式说明）
+_EXPIRATION_VERDICT_PROPERTIES = {
+    "is_expired": {"type": "boolean"},
+    "reasoning": {"type": "string"},
+    "expiration_date": {"type": "string"},
+    "confidence": {"type": "integer"}
+}
+
+VERSION_COMPARE_SCHEMA = {
+    "name": "version_comparison",
+    "strict": True,
+    "schema": {
+        "type": "object",
+        "properties": {
+            "latest_document_id": {"type": "string"},
+            "reasoning": {"type": "string"},
+            "version_comparison": {"type": "string"},
+            "old_document_ids": {"type": "array", "items": {"type": "string"}}
+        },
+        "required": ["latest_document_id", "reasoning", "version_comparison", "old_document_ids"],
+        "additionalProperties": False
+    }
+}
+
+EXPIRATION_SCHEMA = {
+    "name": "expiration_verdict",
+    "strict": True,
+    "schema": {
+        "type": "object",
+        "properties": _EXPIRATION_VERDICT_PROPERTIES,
+        "required": list(_EXPIRATION_VERDICT_PROPERTIES),
+        "additionalProperties": False
+    }
+}
+
+EXPIRATION_BATCH_SCHEMA = {
+    "name": "expiration_verdicts",
+    "strict": True,
+    "schema": {
+        "type": "object",
+        "properties": {
+            "results": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {"index": {"type": "integer"}, **_EXPIRATION_VERDICT_PROPERTIES},
+                    "required": ["index", *_EXPIRATION_VERDICT_PROPERTIES],
+                    "additionalProperties": False
+                }
+            }
+        },
+        "required": ["results"],
+        "additionalProperties": False
+    }
+}
+
+# 表示永久有效的有效期取值
+PERMANENT_EXPIRATION_VALUES = frozenset({'永久', '无', 'permanent', 'none', 'never', '长期'})
+# 支持的有效期日期格式：YYYY-MM-DD、YYYY/MM/DD、YYYY年MM月DD日（一次匹配，不逐个格式尝试）
+EXPIRATION_DATE_RE = re.compile(
+    r'(\d{4})(?:-(\d{1,2})-(\d{1,2})|/(\d{1,2})/(\d{1,2})|年(\d{1,2})月(\d{1,2})日)'
+)
+
+# 版本去重与有效期检查只需要这些字段，按列查询，不加载完整的ORM对象
+DOCUMENT_COLUMNS = (
+    OAFileInfo.id,
+    OAFileInfo.imagefileid,
+    OAFileInfo.imagefilename,
+    OAFileInfo.business_category,
+    OAFileInfo.tokenkey,
+    OAFileInfo.filesize,
+    OAFileInfo.asecode,
+    OAFileInfo.is_zip,
+    OAFileInfo.document_id,
+    OAFileInfo.processing_completed_at,
+)
+
+PreviewSource = namedtuple('PreviewSource', ['imagefilename', 'tokenkey', 'filesize', 'asecode', 'is_zip'])
+
+
 class VersionManager:
     """文档版本管理和有效期管理服务"""
 
+    # 并发下载文档预览的线程数
+    PREVIEW_WORKERS = 8
+    # 纯文本文件预览只读取开头的字节数（AES-ECB按16字节分块解密，需保持16的倍数）
+    PREVIEW_RANGE_BYTES = 64 * 1024
+    # 截取开头部分仍可解析的纯文本扩展名
+    RANGE_PREVIEW_EXTENSIONS = frozenset({'txt', 'md', 'csv'})
+    # 分批读取待处理文档时每批的条数
+    DOCUMENT_CHUNK_SIZE = 500
+    # 有效期检查中每删除多少个文档更新一次数据库记录（中途退出时最多只有这么多记录未更新）
+    DELETED_FLUSH_SIZE = 50
+    # 版本比较使用的预览长度（发文号等版本信息都在文档开头）
+    VERSION_PREVIEW_LENGTH = 250
+    # 单个标题最多返回的相似文档数
+    SIMILAR_DOCUMENTS_LIMIT = 200
+    # 批量查找相似文档时每次查询的标题数
+    SIMILAR_TITLES_PER_QUERY = 100
+    # 修订关键词（预编译为单个正则，一次扫描完成匹配）
+    REVISION_KEYWORDS = ['修订', '修改', '更新', '调整', '变更', '修正', '补充', '完善', '废止', '废除']
+    _REVISION_RE = re.compile('|'.join(map(re.escape, REVISION_KEYWORDS)))
+    # 文档名中《》内的标题
+    _TITLE_RE = re.compile(r'《(.+?)》')
+    # 文档预览缓存键前缀与缓存的字符数（各调用方的预览长度不同，统一缓存较长的前缀后按需截取）
+    PREVIEW_CACHE_PREFIX = "doc_preview:"
+    PREVIEW_CACHE_CHARS = 2000
+    # AI判断结果缓存键前缀，修改提示词或结果格式时升级版本号使旧缓存失效
+    VERDICT_CACHE_PREFIX = "ai_verdict:v1:"
+
     def __init__(self):
-        self.client = None
         self.model_name = settings.openai_model_name
-        self._init_client()
-
-    def _init_client(self):
+        self.batch_enabled = getattr(settings, 'openai_batch_enabled', False)
+        self.batch_poll_interval = getattr(settings, 'openai_batch_poll_interval', 30)
+        self.batch_max_wait = getattr(settings, 'openai_batch_max_wait', 3600)
+        self.expiration_batch_size = getattr(settings, 'openai_expiration_batch_size', 8)
+        self.json_schema_enabled = getattr(settings, 'openai_json_schema_enabled', False)
+        self._preview_executor = None
+        self._preview_executor_lock = threading.Lock()
+        self.verdict_cache_ttl = getattr(settings, 'ai_verdict_cache_ttl', 604800)
+        self.preview_cache_ttl = getattr(settings, 'preview_cache_ttl', 86400)
+        self._redis = None
+
+    @cached_property
+    def client(self) -> Optional[OpenAI]:
+        """OpenAI客户端（首次使用时初始化，未配置或初始化失败时为None）"""
+        return self._init_client()
+
+    def _init_client(self) -> Optional[OpenAI]:
         """初始化OpenAI客户端"""
         try:
             api_key = settings.openai_api_key
             if not api_key:
                 logger.error("未配置OPENAI_API_KEY")
-                return
+                return None
 
             # 构建客户端参数
             client_kwargs = {"api_key": api_key}
@@ -40,11 +227,13 @@ class VersionManager:
                 client_kwargs["base_url"] = settings.openai_base_url
                 logger.info(f"使用自定义OpenAI URL: {settings.openai_base_url}")
 
-            self.client = OpenAI(**client_kwargs)
+            client = OpenAI(**client_kwargs)
             logger.info(f"OpenAI客户端初始化成功，模型: {self.model_name}")
+            return client
 
         except Exception as e:
             logger.error(f"OpenAI客户端初始化失败: {e}")
+            return None
 
     def extract_title_from_brackets(self, filename: str) -> Optional[str]:
         """
@@ -56,8 +245,7 @@ class VersionManager:
         Returns:
             提取的标题，如果没有找到返回None
         """
-        pattern = r'《(.+?)》'
-        match = re.search(pattern, filename)
+        match = self._TITLE_RE.search(filename)
         if match:
             return match.group(1)
         return None
@@ -72,16 +260,56 @@ class VersionManager:
         Returns:
             是否包含修订关键词
         """
-        revision_keywords = ['修订', '修改', '更新', '调整', '变更', '修正', '补充', '完善', '废止', '废除']
-        filename_lower = filename.lower()
-
-        for keyword in revision_keywords:
-            if keyword in filename:
-                logger.info(f"文档名包含修订关键词: {keyword}")
-                return True
+        match = self._REVISION_RE.search(filename)
+        if match:
+            logger.info(f"文档名包含修订关键词: {match.group()}")
+            return True
 
         return False
 
+    def iter_documents(self, db: Session, stmt: Select, limit: int, chunk_size: Optional[int] = None) -> Iterator[Row]:
+        """
+        按完成处理时间倒序（最新处理完成的优先，重新处理过的文档同样靠前）分批读取文档，
+        使用 (processing_completed_at, id) 作为keyset分页，完成时间为空的文档排在最后；
+        边读取边处理，内存占用与单批大小有关而与总数无关
+
+        Args:
+            db: 数据库会话
+            stmt: 包含OAFileInfo.id和OAFileInfo.processing_completed_at列的查询（不带排序和limit）
+            limit: 最多返回的文档数量
+            chunk_size: 每批读取的条数，默认DOCUMENT_CHUNK_SIZE
+
+        Yields:
+            查询结果行
+        """
+        chunk_size = chunk_size or self.DOCUMENT_CHUNK_SIZE
+        remaining = limit
+        last_row = None
+        completed_at = OAFileInfo.processing_completed_at
+
+        while remaining > 0:
+            if last_row is None:
+                page = stmt
+            elif last_row.processing_completed_at is None:
+                page = stmt.where(completed_at.is_(None), OAFileInfo.id < last_row.id)
+            else:
+                page = stmt.where(or_(
+                    completed_at < last_row.processing_completed_at,
+                    and_(completed_at == last_row.processing_completed_at, OAFileInfo.id < last_row.id),
+                    completed_at.is_(None)
+                ))
+            rows = db.execute(
+                page.order_by(completed_at.desc().nulls_last(), OAFileInfo.id.desc())
+                .limit(min(chunk_size, remaining))
+            ).all()
+
+            yield from rows
+
+            if len(rows) < min(chunk_size, remaining):
+                return
+            remaining -= len(rows)
+            last_row = rows[-1]
+
     def find_similar_documents(self, db: Session, title: str, business_category: BusinessCategory) -> List[OAFileInfo]:
         """
         根据标题模糊查询相似文档
@@ -92,65 +320,325 @@ class VersionManager:
             business_category: 业务分类
 
         Returns:
-            相似文档列表
-        """
-        # 使用LIKE进行模糊查询
-        similar_docs = db.query(OAFileInfo).filter(
-            OAFileInfo.business_category == business_category,
-            OAFileInfo.imagefilename.like(f'%{title}%'),
-            OAFileInfo.processing_status == ProcessingStatus.COMPLETED,
-            OAFileInfo.document_id.isnot(None)  # 只查询已成功加入知识库的文档
+            相似文档列表（只包含DOCUMENT_COLUMNS字段的行）
+        """
+        # 使用LIKE进行模糊查询（PostgreSQL下由imagefilename的三元组索引支持）
+        similar_docs = db.execute(
+            select(*DOCUMENT_COLUMNS).where(
+                OAFileInfo.business_category == business_category,
+                OAFileInfo.imagefilename.like(f'%{title}%'),
+                OAFileInfo.processing_status == ProcessingStatus.COMPLETED,
+                OAFileInfo.document_id.isnot(None)  # 只查询已成功加入知识库的文档
+            ).order_by(OAFileInfo.processing_completed_at.desc()).limit(self.SIMILAR_DOCUMENTS_LIMIT)
         ).all()
 
         logger.info(f"找到 {len(similar_docs)} 个标题包含 '{title}' 的文档")
         return similar_docs
 
-    def download_and_extract_document_preview(self, file_info: OAFileInfo, preview_length: int = 400) -> Optional[str]:
+    def find_similar_document_groups(self, db: Session, titles: List[str],
+                                     business_category: BusinessCategory) -> Dict[str, List[Row]]:
+        """
+        批量查找多个标题的相似文档（与find_similar_documents的匹配规则相同），每批标题只需一次查询
+
+        Args:
+            db: 数据库会话
+            titles: 提取的标题列表
+            business_category: 业务分类
+
+        Returns:
+            标题到相似文档列表的映射，按titles的顺序，只包含相似文档不少于2个的标题
+        """
+        groups: Dict[str, List[Row]] = {}
+
+        for start in range(0, len(titles), self.SIMILAR_TITLES_PER_QUERY):
+            batch = titles[start:start + self.SIMILAR_TITLES_PER_QUERY]
+            title_table = union_all(
+                *[select(literal(title, String).label('title')) for title in batch]
+            ).subquery('titles')
+
+            rows = db.execute(
+                select(title_table.c.title, *DOCUMENT_COLUMNS)
+                .join(OAFileInfo, OAFileInfo.imagefilename.contains(title_table.c.title))
+                .where(
+                    OAFileInfo.business_category == business_category,
+                    OAFileInfo.processing_status == ProcessingStatus.COMPLETED,
+                    OAFileInfo.document_id.isnot(None)  # 只查询已成功加入知识库的文档
+                )
+                .order_by(title_table.c.title, OAFileInfo.processing_completed_at.desc())
+            ).all()
+
+            matched: Dict[str, List[Row]] = {}
+            for row in rows:
+                matched.setdefault(row.title, []).append(row)
+
+            for title in batch:
+                similar_docs = matched.get(title, [])[:self.SIMILAR_DOCUMENTS_LIMIT]
+                if len(similar_docs) > 1:
+                    groups[title] = similar_docs
+
+        return groups
+
+    def download_and_extract_document_preview(self, file_info: OAFileInfo, preview_length: int = 400,
+                                              force_refresh: bool = False) -> Optional[str]:
         """
         下载并提取文档的前N个字符
 
         Args:
             file_info: 文件信息
             preview_length: 预览长度，默认400字符
+            force_refresh: 是否忽略缓存重新下载解析
 
         Returns:
             文档预览内容，失败返回None
         """
+        use_cache = (
+            self.preview_cache_ttl > 0
+            and preview_length <= self.PREVIEW_CACHE_CHARS
+            and bool(file_info.tokenkey)
+        )
+        if not use_cache:
+            return self._download_preview(file_info, preview_length)
+
+        # tokenkey对应的文件内容不会变化，同一文件的预览可在各次处理之间复用
+        cache_key = self.PREVIEW_CACHE_PREFIX + hashlib.sha256(
+            f"{file_info.tokenkey}|{file_info.asecode or ''}".encode('utf-8')
+        ).hexdigest()
+
+        if not force_refresh:
+            try:
+                cached = self._get_redis().get(cache_key)
+                if cached is not None:
+                    logger.info(f"命中文档预览缓存: {file_info.imagefilename}")
+                    return cached[:preview_length]
+            except RedisError as e:
+                logger.warning(f"读取文档预览缓存失败: {e}")
+
+        preview = self._download_preview(file_info, self.PREVIEW_CACHE_CHARS)
+        if preview:
+            try:
+                self._get_redis().setex(cache_key, self.preview_cache_ttl, preview)
+            except RedisError as e:
+                logger.warning(f"写入文档预览缓存失败: {e}")
+            preview = preview[:preview_length]
+        return preview
+
+    def _download_preview(self, file_info: OAFileInfo, preview_length: int) -> Optional[str]:
+        """下载并提取文档预览（纯文本文件优先只读取开头部分），失败返回None"""
         try:
-            # 下载文件
-            file_data = s3_service.download_file(file_info.tokenkey)
-            logger.info(f"下载文件成功: {file_info.imagefilename}, 大小: {len(file_data)} 字节")
+            # 纯文本文件只读取开头部分，截断导致解析失败时再下载全文
+            if self._can_preview_from_range(file_info):
+                try:
+                    preview = self._extract_preview(
+                        file_info, preview_length, byte_range=(0, self.PREVIEW_RANGE_BYTES - 1)
+                    )
+                    if preview:
+                        return preview
+                except Exception as e:
+                    logger.warning(f"部分读取文档失败，改为下载全文 {file_info.imagefilename}: {e}")
 
-            # 解密文件
-            if file_info.asecode:
-                decrypted_data = decryption_service.decrypt_binary_data(file_data, file_info.asecode)
-            else:
-                decrypted_data = file_data
+            return self._extract_preview(file_info, preview_length)
 
-            logger.info(f"解密完成: {file_info.imagefilename}")
+        except Exception as e:
+            logger.error(f"下载和提取文档预览失败 {file_info.imagefilename}: {e}")
+            return None
 
-            # 如果是ZIP文件，先解压
-            if file_info.is_zip:
-                extracted_content = decryption_service.extract_zip_files(decrypted_data)
-                parse_result = api_document_parser.parse_document(extracted_content, file_info.imagefilename)
-            else:
-                parse_result = api_document_parser.parse_document(decrypted_data, file_info.imagefilename)
+    def _can_preview_from_range(self, file_info: OAFileInfo) -> bool:
+        """判断文档是否只需读取开头部分即可提取预览（未压缩的纯文本且大于读取范围）"""
+        if file_info.is_zip:
+            return False
+        if file_info.filesize and file_info.filesize <= self.PREVIEW_RANGE_BYTES:
+            return False
+        ext = file_info.imagefilename.rsplit('.', 1)[-1].lower() if '.' in file_info.imagefilename else ''
+        return ext in self.RANGE_PREVIEW_EXTENSIONS
+
+    def _extract_preview(self, file_info: OAFileInfo, preview_length: int,
+                         byte_range: Optional[Tuple[int, int]] = None) -> Optional[str]:
+        """下载（可只下载指定字节范围）、解密、解析文档并截取预览，解析失败返回None"""
+        # 下载文件
+        file_data = s3_service.download_file(file_info.tokenkey, byte_range=byte_range)
+        logger.info(f"下载文件成功: {file_info.imagefilename}, 大小: {len(file_data)} 字节")
+
+        # 解密文件
+        if file_info.asecode:
+            decrypted_data = decryption_service.decrypt_binary_data(file_data, file_info.asecode)
+        else:
+            decrypted_data = file_data
+
+        logger.info(f"解密完成: {file_info.imagefilename}")
+
+        # 如果是ZIP文件，先解压
+        if file_info.is_zip:
+            extracted_content = decryption_service.extract_zip_files(decrypted_data)
+            parse_result = api_document_parser.parse_document(extracted_content, file_info.imagefilename)
+        else:
+            parse_result = api_document_parser.parse_document(decrypted_data, file_info.imagefilename)
+
+        if not parse_result['success']:
+            logger.error(f"解析文档失败: {parse_result['error']}")
+            return None
 
-            if not parse_result['success']:
-                logger.error(f"解析文档失败: {parse_result['error']}")
-                return None
+        content = parse_result['content']
 
-            content = parse_result['content']
+        # 提取前preview_length个字符
+        preview = content[:preview_length] if len(content) > preview_length else content
 
-            # 提取前preview_length个字符
-            preview = content[:preview_length] if len(content) > preview_length else content
+        logger.info(f"成功提取文档预览: {file_info.imagefilename}, 预览长度: {len(preview)} 字符")
+        return preview
 
-            logger.info(f"成功提取文档预览: {file_info.imagefilename}, 预览长度: {len(preview)} 字符")
-            return preview
+    def _build_version_compare_messages(self, documents_with_previews: List[Tuple[OAFileInfo, str]]) -> List[Dict]:
+        """构建版本比较的对话消息"""
+        doc_info_list = []
+        for idx, (file_info, preview) in enumerate(documents_with_previews):
+            doc_info_list.append(f"""
+文档 {idx + 1}:
+- 文件ID: {file_info.imagefileid}
+- 文件名: {file_info.imagefilename}
+- 内容预览（开头部分）:
+{preview}
+""")
 
-        except Exception as e:
-            logger.error(f"下载和提取文档预览失败 {file_info.imagefilename}: {e}")
-            return None
+        prompt = f"""现在有 {len(documents_with_previews)} 个相似的文档，需要你判断哪个是最新版本。
+
+{chr(10).join(doc_info_list)}"""
+
+        return [
+            {
+                "role": "system",
+                "content": self._system_prompt(VERSION_COMPARE_SYSTEM_PROMPT, VERSION_COMPARE_OUTPUT_FORMAT)
+            },
+            {
+                "role": "user",
+                "content": prompt
+            }
+        ]
+
+    def _parse_version_compare_result(self, content_result: str) -> Dict:
+        """解析版本比较的AI返回结果"""
+        result = json_loads(content_result or "{}")
+
+        latest_doc_id = result.get("latest_document_id")
+        reasoning = result.get("reasoning", "")
+        old_doc_ids = result.get("old_document_ids", [])
+
+        logger.info(f"AI版本比较完成 - 最新版本: {latest_doc_id}")
+        logger.info(f"判断理由: {reasoning}")
+        logger.info(f"旧版本文档: {old_doc_ids}")
+
+        return {
+            'latest_document_id': latest_doc_id,
+            'reasoning': reasoning,
+            'old_document_ids': old_doc_ids,
+            'version_comparison': result.get('version_comparison', '')
+        }
+
+    def _system_prompt(self, instructions: str, output_format: str) -> str:
+        """组合system提示词：启用json_schema时输出格式由结构定义约束，不再重复格式说明"""
+        if self.json_schema_enabled:
+            return instructions
+        return f"{instructions}\n\n{output_format}"
+
+    def _chat_request_body(self, messages: List[Dict], max_tokens: int, schema: Optional[Dict] = None) -> Dict:
+        """构建chat.completions请求参数（同步调用与Batch任务共用）"""
+        if schema and self.json_schema_enabled:
+            response_format = {"type": "json_schema", "json_schema": schema}
+        else:
+            response_format = {"type": "json_object"}
+
+        return {
+            "model": self.model_name,
+            "messages": messages,
+            "response_format": response_format,
+            "temperature": 0.1,
+            "max_tokens": max_tokens
+        }
+
+    def _get_preview_executor(self) -> ThreadPoolExecutor:
+        """获取下载文档预览的线程池（首次使用时创建，之后复用）"""
+        if self._preview_executor is None:
+            with self._preview_executor_lock:
+                if self._preview_executor is None:
+                    self._preview_executor = ThreadPoolExecutor(
+                        max_workers=self.PREVIEW_WORKERS,
+                        thread_name_prefix="preview-download"
+                    )
+        return self._preview_executor
+
+    def download_previews(self, documents: List[OAFileInfo], preview_length: int = 400) -> List[Optional[str]]:
+        """
+        并发下载并提取多个文档的预览
+
+        Args:
+            documents: 文件信息列表
+            preview_length: 预览长度
+
+        Returns:
+            与documents一一对应的预览内容列表，失败的项为None
+        """
+        # 数据库会话不是线程安全的，下载线程只使用预先读出的字段，不访问ORM对象
+        sources = [
+            PreviewSource(doc.imagefilename, doc.tokenkey, doc.filesize, doc.asecode, doc.is_zip)
+            for doc in documents
+        ]
+
+        if len(sources) <= 1:
+            return [self.download_and_extract_document_preview(source, preview_length) for source in sources]
+
+        executor = self._get_preview_executor()
+        return list(executor.map(
+            lambda source: self.download_and_extract_document_preview(source, preview_length),
+            sources
+        ))
+
+    def _get_redis(self) -> Redis:
+        """获取Redis客户端（首次使用时创建）"""
+        if self._redis is None:
+            self._redis = Redis.from_url(
+                settings.redis_url,
+                socket_connect_timeout=3,
+                socket_timeout=3,
+                decode_responses=True
+            )
+        return self._redis
+
+    def _verdict_cache_key(self, body: Dict) -> str:
+        """根据完整的请求参数（模型、提示词、文档预览等）生成AI结果缓存键"""
+        payload = json.dumps(body, ensure_ascii=False, sort_keys=True)
+        return self.VERDICT_CACHE_PREFIX + hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def _get_cached_verdicts(self, bodies: List[Dict]) -> List[Optional[str]]:
+        """批量读取缓存的AI回复内容，未命中或Redis不可用时为None"""
+        if self.verdict_cache_ttl <= 0 or not bodies:
+            return [None] * len(bodies)
+        try:
+            return self._get_redis().mget([self._verdict_cache_key(body) for body in bodies])
+        except RedisError as e:
+            logger.warning(f"读取AI结果缓存失败: {e}")
+            return [None] * len(bodies)
+
+    def _store_verdicts(self, items: List[Tuple[Dict, str]]):
+        """写入AI回复内容缓存"""
+        if self.verdict_cache_ttl <= 0 or not items:
+            return
+        try:
+            with self._get_redis().pipeline(transaction=False) as pipe:
+                for body, content in items:
+                    pipe.setex(self._verdict_cache_key(body), self.verdict_cache_ttl, content)
+                pipe.execute()
+        except RedisError as e:
+            logger.warning(f"写入AI结果缓存失败: {e}")
+
+    def _create_chat_completion(self, body: Dict, check_cache: bool = True) -> str:
+        """调用chat.completions并返回回复内容，相同请求优先使用缓存结果"""
+        if check_cache:
+            cached = self._get_cached_verdicts([body])[0]
+            if cached is not None:
+                logger.info("命中AI结果缓存")
+                return cached
+
+        response = self.client.chat.completions.create(**body)
+        content_result = response.choices[0].message.content or "{}"
+        self._store_verdicts([(body, content_result)])
+        return content_result
 
     def compare_versions_by_ai(self, documents_with_previews: List[Tuple[OAFileInfo, str]]) -> Optional[str]:
         """
@@ -171,83 +659,141 @@ class VersionManager:
             return None
 
         try:
-            # 构建提示词
-            doc_info_list = []
-            for idx, (file_info, preview) in enumerate(documents_with_previews):
-                doc_info_list.append(f"""
-文档 {idx + 1}:
-- 文件ID: {file_info.imagefileid}
-- 文件名: {file_info.imagefilename}
-- 内容预览（前400字）:
-{preview}
-""")
+            messages = self._build_version_compare_messages(documents_with_previews)
 
-            prompt = f"""
-你是一个专业的文档版本分析专家。现在有 {len(documents_with_previews)} 个相似的文档，需要你判断哪个是最新版本。
+            logger.info(f"AI版本比较请求 - 文档数量: {len(documents_with_previews)}")
 
-{chr(10).join(doc_info_list)}
+            # 调用AI
+            content_result = self._create_chat_completion(
+                self._chat_request_body(messages, max_tokens=1000, schema=VERSION_COMPARE_SCHEMA)
+            )
 
-请仔细分析每个文档的内容预览，特别关注：
-1. 文档开头的发文号（例如：昆农商发【2025】xxx号）
-2. 文档中提到的版本号、修订日期等信息
-3. 文档名中的修订标识
+            return self._parse_version_compare_result(content_result)
 
-请返回JSON格式的结果，包含以下字段：
-{{
-    "latest_document_id": "最新版本文档的文件ID",
-    "reasoning": "判断理由",
-    "version_comparison": "版本对比说明",
-    "old_document_ids": ["旧版本文档的文件ID列表"]
-}}
-"""
+        except Exception as e:
+            logger.error(f"AI版本比较失败: {e}")
+            return None
 
-            messages = [
-                {
-                    "role": "system",
-                    "content": "你是一个专业的文档版本分析专家，擅长通过文档内容判断版本新旧。"
-                },
-                {
-                    "role": "user",
-                    "content": prompt
-                }
-            ]
+    def submit_batch_jobs(self, requests: List[Dict]) -> Optional[Dict[str, str]]:
+        """
+        通过OpenAI Batch API批量提交对话请求，并等待结果
 
-            logger.info(f"AI版本比较请求 - 文档数量: {len(documents_with_previews)}")
+        Args:
+            requests: 请求列表，每项包含custom_id和body（chat.completions请求参数）
 
-            # 调用AI
-            response = self.client.chat.completions.create(
-                model=self.model_name,
-                messages=messages,
-                response_format={"type": "json_object"},
-                temperature=0.1,
-                max_tokens=1000
-            )
+        Returns:
+            custom_id到模型回复内容的映射，任务失败或超时返回None
+        """
+        if not self.client or not requests:
+            return None
 
-            content_result = response.choices[0].message.content or "{}"
-            result = json.loads(content_result)
+        batch_id = None
+        try:
+            lines = [
+                json.dumps({
+                    "custom_id": request["custom_id"],
+                    "method": "POST",
+                    "url": "/v1/chat/completions",
+                    "body": request["body"]
+                }, ensure_ascii=False)
+                for request in requests
+            ]
 
-            latest_doc_id = result.get("latest_document_id")
-            reasoning = result.get("reasoning", "")
-            old_doc_ids = result.get("old_document_ids", [])
+            input_file = self.client.files.create(
+                file=("batch_input.jsonl", "\n".join(lines).encode("utf-8")),
+                purpose="batch"
+            )
+            batch = self.client.batches.create(
+                input_file_id=input_file.id,
+                endpoint="/v1/chat/completions",
+                completion_window="24h"
+            )
+            batch_id = batch.id
+            logger.info(f"已提交Batch任务: {batch_id}, 请求数量: {len(requests)}")
+
+            # 轮询任务状态
+            deadline = time.monotonic() + self.batch_max_wait
+            while batch.status not in BATCH_TERMINAL_STATUSES:
+                if time.monotonic() >= deadline:
+                    logger.warning(f"Batch任务等待超时，取消任务: {batch_id}")
+                    self.client.batches.cancel(batch_id)
+                    return None
+                time.sleep(self.batch_poll_interval)
+                batch = self.client.batches.retrieve(batch_id)
+
+            if batch.status != 'completed' or not batch.output_file_id:
+                logger.error(f"Batch任务未成功完成: {batch_id}, 状态: {batch.status}")
+                return None
 
-            logger.info(f"AI版本比较完成 - 最新版本: {latest_doc_id}")
-            logger.info(f"判断理由: {reasoning}")
-            logger.info(f"旧版本文档: {old_doc_ids}")
+            # 读取结果文件，按custom_id整理回复内容
+            output = self.client.files.content(batch.output_file_id).text
+            results = {}
+            for line in output.splitlines():
+                if not line.strip():
+                    continue
+                item = json_loads(line)
+                response = item.get("response") or {}
+                if response.get("status_code") != 200:
+                    logger.warning(f"Batch请求失败: {item.get('custom_id')}, 错误: {item.get('error')}")
+                    continue
+                choices = (response.get("body") or {}).get("choices") or []
+                if choices:
+                    results[item["custom_id"]] = choices[0]["message"].get("content") or "{}"
 
-            return {
-                'latest_document_id': latest_doc_id,
-                'reasoning': reasoning,
-                'old_document_ids': old_doc_ids,
-                'version_comparison': result.get('version_comparison', '')
-            }
+            logger.info(f"Batch任务完成: {batch_id}, 成功 {len(results)}/{len(requests)}")
+            return results
 
         except Exception as e:
-            logger.error(f"AI版本比较失败: {e}")
+            logger.error(f"Batch任务执行失败 {batch_id or ''}: {e}")
             return None
 
+    def _run_chat_requests(self, requests: List[Dict]) -> Dict[str, str]:
+        """
+        执行一组对话请求：启用Batch API时整体提交，Batch未返回结果的请求再逐条同步调用
+
+        Args:
+            requests: 请求列表，每项包含custom_id和body
+
+        Returns:
+            custom_id到模型回复内容的映射（调用失败的请求不在其中）
+        """
+        results = {}
+        if not self.client or not requests:
+            return results
+
+        # 之前判断过的相同请求直接使用缓存结果
+        cached = self._get_cached_verdicts([request["body"] for request in requests])
+        pending = []
+        for request, content_result in zip(requests, cached):
+            if content_result is not None:
+                results[request["custom_id"]] = content_result
+            else:
+                pending.append(request)
+
+        if cached and len(pending) < len(requests):
+            logger.info(f"命中AI结果缓存 {len(requests) - len(pending)}/{len(requests)}")
+
+        if self.batch_enabled and len(pending) > 1:
+            batch_results = self.submit_batch_jobs(pending) or {}
+            self._store_verdicts([
+                (request["body"], batch_results[request["custom_id"]])
+                for request in pending if request["custom_id"] in batch_results
+            ])
+            results.update(batch_results)
+
+        for request in pending:
+            if request["custom_id"] in results:
+                continue
+            try:
+                results[request["custom_id"]] = self._create_chat_completion(request["body"], check_cache=False)
+            except Exception as e:
+                logger.error(f"AI请求失败 {request['custom_id']}: {e}")
+
+        return results
+
     def delete_document_from_dify(self, file_info: OAFileInfo, db: Session) -> bool:
         """
-        从Dify知识库中删除文档
+        从Dify知识库中删除文档（不更新数据库，删除成功的文档由调用方通过mark_documents_deleted批量更新状态）
 
         Args:
             file_info: 文件信息
@@ -277,13 +823,6 @@ class VersionManager:
 
             if result['success']:
                 logger.info(f"成功从知识库删除文档: {file_info.imagefilename} (document_id: {file_info.document_id})")
-
-                # 更新数据库记录
-                file_info.processing_status = ProcessingStatus.SKIPPED
-                file_info.processing_message = f"旧版本文档已删除 - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
-                file_info.document_id = None
-                db.commit()
-
                 return True
             else:
                 logger.error(f"删除文档失败: {result['error']}")
@@ -293,6 +832,36 @@ class VersionManager:
             logger.error(f"删除文档时发生异常: {e}")
             return False
 
+    def mark_documents_deleted(self, db: Session, file_ids: List[int], now: Optional[datetime] = None):
+        """
+        批量更新已从知识库删除的文档记录（一条UPDATE语句、一次提交）
+
+        Args:
+            db: 数据库会话
+            file_ids: 文档主键id列表
+            now: 删除时间（默认取当前时间）
+        """
+        if not file_ids:
+            return
+
+        deleted_at = (now or datetime.now()).strftime('%Y-%m-%d %H:%M:%S')
+
+        try:
+            db.execute(
+                update(OAFileInfo)
+                .where(OAFileInfo.id.in_(file_ids))
+                .values(
+                    processing_status=ProcessingStatus.SKIPPED,
+                    processing_message=f"旧版本文档已删除 - {deleted_at}",
+                    document_id=None
+                )
+            )
+            db.commit()
+            logger.info(f"已更新 {len(file_ids)} 个已删除文档的记录")
+        except Exception as e:
+            db.rollback()
+            logger.error(f"更新已删除文档记录失败: {e}")
+
     def process_headquarters_version_deduplication(self, db: Session, limit: int = 2000) -> Dict:
         """
         处理总行发文的版本去重
@@ -313,15 +882,24 @@ class VersionManager:
         }
 
         try:
-            # 查询所有已完成的总行发文，按创建时间倒序排序（最新的优先）
-            headquarters_docs = db.query(OAFileInfo).filter(
-                OAFileInfo.business_category == BusinessCategory.HEADQUARTERS_ISSUE,
-                OAFileInfo.processing_status == ProcessingStatus.COMPLETED,
-                OAFileInfo.document_id.isnot(None)
-            ).order_by(OAFileInfo.processing_completed_at.desc()).limit(limit).all()
+            # 分批读取所有已完成的总行发文，按完成处理时间倒序（最新的优先）
+            # 修订关键词在数据库端过滤，只返回可能存在旧版本的文档
+            headquarters_docs = self.iter_documents(
+                db,
+                select(*DOCUMENT_COLUMNS).where(
+                    OAFileInfo.business_category == BusinessCategory.HEADQUARTERS_ISSUE,
+                    OAFileInfo.processing_status == ProcessingStatus.COMPLETED,
+                    OAFileInfo.document_id.isnot(None),
+                    or_(*[OAFileInfo.imagefilename.like(f'%{keyword}%') for keyword in self.REVISION_KEYWORDS])
+                ),
+                limit
+            )
 
-            logger.info(f"找到 {len(headquarters_docs)} 个总行发文待处理（limit={limit}）")
+            logger.info(f"开始处理含修订关键词的总行发文（limit={limit}）")
 
+            # 先收集所有待比较的标题，再一次性查询各标题的相似文档
+            titles = []
+            seen_titles = set()
             for file_info in headquarters_docs:
                 stats['processed'] += 1
 
@@ -337,50 +915,94 @@ class VersionManager:
                         logger.warning(f"无法从文档名提取标题: {file_info.imagefilename}")
                         continue
 
+                    # 同一标题只比较一次
+                    if title in seen_titles:
+                        continue
+                    seen_titles.add(title)
+
                     logger.info(f"提取标题: {title}")
+                    titles.append(title)
 
-                    # 查找相似文档
-                    similar_docs = self.find_similar_documents(db, title, BusinessCategory.HEADQUARTERS_ISSUE)
+                except Exception as e:
+                    logger.error(f"处理文档时发生错误 {file_info.imagefilename}: {e}")
+                    stats['errors'] += 1
+                    continue
 
-                    if len(similar_docs) <= 1:
-                        logger.info(f"没有找到重复文档，跳过: {title}")
-                        continue
+            # 查找相似文档（只返回存在重复的标题）
+            similar_groups = self.find_similar_document_groups(db, titles, BusinessCategory.HEADQUARTERS_ISSUE)
+            logger.info(f"{len(titles)} 个标题中有 {len(similar_groups)} 个存在重复文档")
 
+            # 收集所有需要比较的重复文档组，再统一提交AI判断
+            groups = []
+            for title, similar_docs in similar_groups.items():
+                try:
                     stats['duplicates_found'] += 1
                     logger.info(f"找到 {len(similar_docs)} 个相似文档")
 
                     # 下载并提取文档预览
-                    documents_with_previews = []
-                    for doc in similar_docs:
-                        preview = self.download_and_extract_document_preview(doc, preview_length=400)
-                        if preview:
-                            documents_with_previews.append((doc, preview))
+                    previews = self.download_previews(similar_docs, preview_length=self.VERSION_PREVIEW_LENGTH)
+                    documents_with_previews = [
+                        (doc, preview) for doc, preview in zip(similar_docs, previews) if preview
+                    ]
 
                     if len(documents_with_previews) < 2:
                         logger.warning(f"可下载的文档不足2个，跳过版本比较")
                         continue
 
-                    # 使用AI判断最新版本
-                    comparison_result = self.compare_versions_by_ai(documents_with_previews)
+                    groups.append((f"version-{len(groups)}", title, documents_with_previews))
+
+                except Exception as e:
+                    logger.error(f"处理重复文档组时发生错误 {title}: {e}")
+                    stats['errors'] += 1
+                    continue
+
+            if not groups:
+                return stats
+
+            if not self.client:
+                logger.error("OpenAI客户端未初始化")
+                stats['errors'] += len(groups)
+                return stats
 
-                    if not comparison_result:
-                        logger.error("AI版本比较失败")
+            # 使用AI判断最新版本
+            logger.info(f"AI版本比较请求 - 文档组数量: {len(groups)}")
+            requests = [
+                {
+                    "custom_id": custom_id,
+                    "body": self._chat_request_body(
+                        self._build_version_compare_messages(documents_with_previews), max_tokens=1000,
+                        schema=VERSION_COMPARE_SCHEMA
+                    )
+                }
+                for custom_id, _, documents_with_previews in groups
+            ]
+            responses = self._run_chat_requests(requests)
+
+            for custom_id, title, _ in groups:
+                try:
+                    if custom_id not in responses:
+                        logger.error(f"AI版本比较失败: {title}")
                         stats['errors'] += 1
                         continue
 
+                    comparison_result = self._parse_version_compare_result(responses[custom_id])
+
                     latest_doc_id = comparison_result['latest_document_id']
                     old_doc_ids = comparison_result['old_document_ids']
 
-                    # 删除旧版本文档
-                    deleted_count = 0
-                    for old_id in old_doc_ids:
-                        old_file = db.query(OAFileInfo).filter(
-                            OAFileInfo.imagefileid == old_id
-                        ).first()
+                    # 删除旧版本文档，删除成功的记录一次性更新
+                    old_files = db.execute(
+                        select(*DOCUMENT_COLUMNS).where(OAFileInfo.imagefileid.in_(old_doc_ids))
+                    ).all() if old_doc_ids else []
 
-                        if old_file and self.delete_document_from_dify(old_file, db):
-                            deleted_count += 1
-                            stats['deleted'] += 1
+                    deleted_ids = [
+                        old_file.id for old_file in old_files
+                        if self.delete_document_from_dify(old_file, db)
+                    ]
+                    self.mark_documents_deleted(db, deleted_ids)
+
+                    deleted_count = len(deleted_ids)
+                    stats['deleted'] += deleted_count
 
                     stats['details'].append({
                         'title': title,
@@ -390,7 +1012,7 @@ class VersionManager:
                     })
 
                 except Exception as e:
-                    logger.error(f"处理文档时发生错误 {file_info.imagefilename}: {e}")
+                    logger.error(f"处理重复文档组时发生错误 {title}: {e}")
                     stats['errors'] += 1
                     continue
 
@@ -401,12 +1023,42 @@ class VersionManager:
             stats['errors'] += 1
             return stats
 
-    def check_document_expiration_by_metadata(self, file_info: OAFileInfo) -> Tuple[bool, Optional[str]]:
+    @staticmethod
+    def parse_expiration_date(expiration_date_str) -> Tuple[Optional[date], bool]:
+        """
+        解析AI元数据中的有效期
+
+        Args:
+            expiration_date_str: ai_metadata中的expiration_date
+
+        Returns:
+            (有效期日期, 是否永久有效)，没有有效期或无法解析时日期为None
+        """
+        if not expiration_date_str or not isinstance(expiration_date_str, str):
+            return None, False
+
+        if expiration_date_str in PERMANENT_EXPIRATION_VALUES:
+            return None, True
+
+        match = EXPIRATION_DATE_RE.fullmatch(expiration_date_str)
+        if not match:
+            return None, False
+
+        year, *parts = match.groups()
+        month, day = [int(part) for part in parts if part is not None]
+        try:
+            return date(int(year), month, day), False
+        except ValueError:
+            return None, False
+
+    def check_document_expiration_by_metadata(self, file_info: OAFileInfo,
+                                              today: Optional[date] = None) -> Tuple[bool, Optional[str]]:
         """
         通过ai_metadata检查文档是否过期
 
         Args:
             file_info: 文件信息
+            today: 当天日期（批量检查时由调用方传入，默认取当前日期）
 
         Returns:
             (是否过期, 过期日期)
@@ -415,55 +1067,181 @@ class VersionManager:
             if not file_info.ai_analysis_result:
                 return False, None
 
-            analysis_result = json.loads(file_info.ai_analysis_result)
+            analysis_result = json_loads(file_info.ai_analysis_result)
             ai_metadata = analysis_result.get('ai_metadata', {})
 
-            expiration_date_str = ai_metadata.get('expiration_date')
+            return self.check_expiration_value(file_info, ai_metadata.get('expiration_date'), today)
 
-            if not expiration_date_str:
-                logger.debug(f"文档 {file_info.imagefilename} 没有有效期信息")
-                return False, None
+        except Exception as e:
+            logger.error(f"检查文档有效期失败 {file_info.imagefilename}: {e}")
+            return False, None
+
+    def check_expiration_value(self, file_info: OAFileInfo, expiration_date_str,
+                               today: Optional[date] = None) -> Tuple[bool, Optional[str]]:
+        """
+        根据ai_metadata中的有效期取值检查文档是否过期
+
+        Args:
+            file_info: 文件信息
+            expiration_date_str: ai_metadata中的expiration_date
+            today: 当天日期（批量检查时由调用方传入，默认取当前日期）
+
+        Returns:
+            (是否过期, 过期日期)
+        """
+        if not expiration_date_str:
+            logger.debug(f"文档 {file_info.imagefilename} 没有有效期信息")
+            return False, None
+
+        # 尝试解析日期
+        try:
+            expiration_date, is_permanent = self.parse_expiration_date(expiration_date_str)
 
             # 检查是否为永久有效
-            if expiration_date_str in ['永久', '无', 'permanent', 'none', 'never', '长期']:
+            if is_permanent:
                 logger.info(f"文档 {file_info.imagefilename} 永久有效")
                 return False, expiration_date_str
 
-            # 尝试解析日期
-            try:
-                # 支持多种日期格式
-                date_formats = ['%Y-%m-%d', '%Y/%m/%d', '%Y年%m月%d日']
-                expiration_date = None
-
-                for fmt in date_formats:
-                    try:
-                        expiration_date = datetime.strptime(expiration_date_str, fmt)
-                        break
-                    except ValueError:
-                        continue
+            if not expiration_date:
+                logger.warning(f"无法解析有效期日期: {expiration_date_str}")
+                return False, expiration_date_str
 
-                if not expiration_date:
-                    logger.warning(f"无法解析有效期日期: {expiration_date_str}")
-                    return False, expiration_date_str
+            # 比较日期（有效期当天起视为过期）
+            is_expired = expiration_date <= (today or date.today())
 
-                # 比较日期
-                now = datetime.now()
-                is_expired = expiration_date < now
+            if is_expired:
+                logger.info(f"文档 {file_info.imagefilename} 已过期，有效期: {expiration_date_str}")
+            else:
+                logger.debug(f"文档 {file_info.imagefilename} 未过期，有效期: {expiration_date_str}")
 
-                if is_expired:
-                    logger.info(f"文档 {file_info.imagefilename} 已过期，有效期: {expiration_date_str}")
-                else:
-                    logger.debug(f"文档 {file_info.imagefilename} 未过期，有效期: {expiration_date_str}")
+            return is_expired, expiration_date_str
 
-                return is_expired, expiration_date_str
+        except Exception as e:
+            logger.error(f"解析日期失败 {expiration_date_str}: {e}")
+            return False, expiration_date_str
 
-            except Exception as e:
-                logger.error(f"解析日期失败 {expiration_date_str}: {e}")
-                return False, expiration_date_str
+    def _build_expiration_messages(self, file_info: OAFileInfo, preview_content: str) -> List[Dict]:
+        """构建有效期检查的对话消息"""
+        today = datetime.now().strftime('%Y-%m-%d')
 
-        except Exception as e:
-            logger.error(f"检查文档有效期失败 {file_info.imagefilename}: {e}")
-            return False, None
+        prompt = f"""今天的日期是: {today}
+
+文档信息：
+- 文件名: {file_info.imagefilename}
+- 内容预览:
+{preview_content}"""
+
+        return [
+            {
+                "role": "system",
+                "content": self._system_prompt(EXPIRATION_SYSTEM_PROMPT, EXPIRATION_OUTPUT_FORMAT)
+            },
+            {
+                "role": "user",
+                "content": prompt
+            }
+        ]
+
+    def _parse_expiration_result(self, file_info: OAFileInfo, content_result: str) -> Tuple[bool, str]:
+        """解析有效期检查的AI返回结果"""
+        result = json_loads(content_result or "{}")
+
+        is_expired = result.get("is_expired", False)
+        reasoning = result.get("reasoning", "")
+
+        logger.info(f"AI有效期检查完成 - 文档: {file_info.imagefilename}, 是否过期: {is_expired}")
+        logger.info(f"判断理由: {reasoning}")
+
+        return is_expired, reasoning
+
+    def _build_expiration_batch_messages(self, items: List[Tuple[OAFileInfo, str]]) -> List[Dict]:
+        """构建多文档合并判断有效期的对话消息，文档以[序号]标记"""
+        today = datetime.now().strftime('%Y-%m-%d')
+
+        doc_info_list = []
+        for idx, (file_info, preview) in enumerate(items, 1):
+            doc_info_list.append(f"""
+[{idx}]
+- 文件名: {file_info.imagefilename}
+- 内容预览:
+{preview}
+""")
+
+        prompt = f"""今天的日期是: {today}
+
+以下共 {len(items)} 个文档：
+{chr(10).join(doc_info_list)}"""
+
+        return [
+            {
+                "role": "system",
+                "content": self._system_prompt(EXPIRATION_BATCH_SYSTEM_PROMPT, EXPIRATION_BATCH_OUTPUT_FORMAT)
+            },
+            {
+                "role": "user",
+                "content": prompt
+            }
+        ]
+
+    def check_expiration_batch(self, items: List[Tuple[OAFileInfo, str]], batch_size: int = 8) -> List[Tuple[bool, str]]:
+        """
+        多个文档合并到一次对话中判断是否过期
+
+        Args:
+            items: (文件信息, 文档预览内容) 列表
+            batch_size: 每次对话合并判断的文档数
+
+        Returns:
+            与items一一对应的 (是否过期, 判断理由) 列表
+        """
+        if not self.client:
+            logger.error("OpenAI客户端未初始化")
+            return [(False, "AI客户端未初始化")] * len(items)
+
+        batch_size = max(1, batch_size)
+        chunks = [items[start:start + batch_size] for start in range(0, len(items), batch_size)]
+
+        logger.info(f"AI有效期检查请求 - 文档数量: {len(items)}, 请求数量: {len(chunks)}")
+
+        requests = [
+            {
+                "custom_id": f"expiration-{idx}",
+                "body": self._chat_request_body(
+                    self._build_expiration_batch_messages(chunk), max_tokens=200 + 300 * len(chunk),
+                    schema=EXPIRATION_BATCH_SCHEMA
+                )
+            }
+            for idx, chunk in enumerate(chunks)
+        ]
+        responses = self._run_chat_requests(requests)
+
+        verdicts = []
+        for idx, chunk in enumerate(chunks):
+            # 按序号取回各文档的判断结果
+            by_index = {}
+            content_result = responses.get(f"expiration-{idx}")
+            if content_result is not None:
+                try:
+                    for item in json_loads(content_result).get("results", []):
+                        if isinstance(item, dict):
+                            by_index[item.get("index")] = item
+                except (ValueError, AttributeError) as e:
+                    logger.error(f"解析AI有效期检查结果失败: {e}")
+
+            for position, (file_info, preview) in enumerate(chunk, 1):
+                item = by_index.get(position)
+                if item is None:
+                    # 合并判断未返回该文档的结果，单独判断
+                    verdicts.append(self.check_document_expiration_by_ai(file_info, preview))
+                    continue
+
+                is_expired = item.get("is_expired", False)
+                reasoning = item.get("reasoning", "")
+                logger.info(f"AI有效期检查完成 - 文档: {file_info.imagefilename}, 是否过期: {is_expired}")
+                logger.info(f"判断理由: {reasoning}")
+                verdicts.append((is_expired, reasoning))
+
+        return verdicts
 
     def check_document_expiration_by_ai(self, file_info: OAFileInfo, preview_content: str) -> Tuple[bool, str]:
         """
@@ -481,67 +1259,30 @@ class VersionManager:
             return False, "AI客户端未初始化"
 
         try:
-            today = datetime.now().strftime('%Y-%m-%d')
-
-            prompt = f"""
-今天的日期是: {today}
-
-请分析以下文档是否已经过期。重点关注：
-1. 文档标题中的日期信息
-2. 文档内容中提到的时间区间、有效期
-3. 文档中的生效日期和失效日期
-
-文档信息：
-- 文件名: {file_info.imagefilename}
-- 内容预览:
-{preview_content}
-
-请返回JSON格式的结果：
-{{
-    "is_expired": true/false,
-    "reasoning": "判断理由",
-    "expiration_date": "过期日期（如果能找到）",
-    "confidence": 0-100
-}}
-"""
-
-            messages = [
-                {
-                    "role": "system",
-                    "content": "你是一个专业的文档有效期分析专家，擅长判断文档是否过期。"
-                },
-                {
-                    "role": "user",
-                    "content": prompt
-                }
-            ]
+            messages = self._build_expiration_messages(file_info, preview_content)
 
             logger.info(f"AI有效期检查请求 - 文档: {file_info.imagefilename}")
 
             # 调用AI
-            response = self.client.chat.completions.create(
-                model=self.model_name,
-                messages=messages,
-                response_format={"type": "json_object"},
-                temperature=0.1,
-                max_tokens=500
+            content_result = self._create_chat_completion(
+                self._chat_request_body(messages, max_tokens=500, schema=EXPIRATION_SCHEMA)
             )
 
-            content_result = response.choices[0].message.content or "{}"
-            result = json.loads(content_result)
-
-            is_expired = result.get("is_expired", False)
-            reasoning = result.get("reasoning", "")
-
-            logger.info(f"AI有效期检查完成 - 文档: {file_info.imagefilename}, 是否过期: {is_expired}")
-            logger.info(f"判断理由: {reasoning}")
-
-            return is_expired, reasoning
+            return self._parse_expiration_result(file_info, content_result)
 
         except Exception as e:
             logger.error(f"AI有效期检查失败: {e}")
             return False, f"检查失败: {str(e)}"
 
+    @staticmethod
+    def _expiration_date_json_expr(db: Session):
+        """ai_analysis_result中ai_metadata.expiration_date的SQL取值表达式"""
+        if db.get_bind().dialect.name == 'postgresql':
+            analysis = cast(OAFileInfo.ai_analysis_result, JSONB)
+        else:
+            analysis = type_coerce(OAFileInfo.ai_analysis_result, JSON)
+        return analysis[('ai_metadata', 'expiration_date')].as_string()
+
     def process_document_expiration_check(self, db: Session, limit: int = 2000) -> Dict:
         """
         处理文档有效期检查（排除总行发文）
@@ -562,28 +1303,87 @@ class VersionManager:
             'details': []
         }
 
+        # 删除成功的文档id，每累积DELETED_FLUSH_SIZE个批量更新一次数据库记录，剩余的在结束时更新
+        deleted_ids = []
+
+        def record_deleted(file_id: int):
+            deleted_ids.append(file_id)
+            if len(deleted_ids) >= self.DELETED_FLUSH_SIZE:
+                self.mark_documents_deleted(db, deleted_ids)
+                deleted_ids.clear()
+
         try:
-            # 查询所有已完成的非总行发文，按创建时间倒序排序（最新的优先）
-            documents = db.query(OAFileInfo).filter(
+            # 已完成的非总行发文，分批读取，按完成处理时间倒序（最新的优先）
+            base_conditions = (
                 OAFileInfo.business_category != BusinessCategory.HEADQUARTERS_ISSUE,
                 OAFileInfo.processing_status == ProcessingStatus.COMPLETED,
-                OAFileInfo.document_id.isnot(None)
-            ).order_by(OAFileInfo.processing_completed_at.desc()).limit(limit).all()
+                OAFileInfo.document_id.isnot(None),
+                OAFileInfo.expiration_is_permanent.isnot(True)
+            )
+
+            logger.info(f"开始检查非总行发文有效期（limit={limit}）")
+
+            # 整个检查过程使用同一个日期，不在每行中重复获取
+            today = date.today()
+
+            # 有效期已解析入列且已到期的文档，直接按日期列查询
+            expired_docs = self.iter_documents(
+                db,
+                select(*DOCUMENT_COLUMNS, OAFileInfo.expiration_date_parsed).where(
+                    *base_conditions,
+                    OAFileInfo.expiration_date_parsed <= today
+                ),
+                limit
+            )
+
+            for file_info in expired_docs:
+                stats['processed'] += 1
+                stats['expired_by_metadata'] += 1
+                logger.info(f"文档 {file_info.imagefilename} 已过期，有效期: {file_info.expiration_date_parsed}")
+
+                # 删除过期文档
+                if self.delete_document_from_dify(file_info, db):
+                    record_deleted(file_info.id)
+                    stats['deleted'] += 1
+                    stats['details'].append({
+                        'filename': file_info.imagefilename,
+                        'expiration_date': file_info.expiration_date_parsed.isoformat(),
+                        'check_method': 'metadata'
+                    })
 
-            logger.info(f"找到 {len(documents)} 个非总行发文待检查有效期（limit={limit}）")
+            # 有效期列为空的文档（没有有效期、无法解析或加列前入库的历史数据）按AI元数据或AI判断检查，
+            # 只在数据库端取出ai_metadata.expiration_date，不传输完整的AI分析结果；
+            # 两次查询共用limit，本次只取剩余的数量
+            documents = self.iter_documents(
+                db,
+                select(
+                    *DOCUMENT_COLUMNS,
+                    self._expiration_date_json_expr(db).label('expiration_date_raw'),
+                    OAFileInfo.ai_analysis_result.isnot(None).label('has_ai_analysis')
+                ).where(
+                    *base_conditions,
+                    OAFileInfo.expiration_date_parsed.is_(None)
+                ),
+                limit - stats['processed']
+            )
 
+            # 需要AI判断的文档先收集起来，统一并发下载预览后再提交
+            preview_candidates = []
             for file_info in documents:
                 stats['processed'] += 1
 
                 try:
                     # 先检查ai_metadata中的有效期
-                    is_expired, expiration_info = self.check_document_expiration_by_metadata(file_info)
+                    is_expired, expiration_info = self.check_expiration_value(
+                        file_info, file_info.expiration_date_raw, today
+                    )
 
                     if is_expired:
                         stats['expired_by_metadata'] += 1
 
                         # 删除过期文档
                         if self.delete_document_from_dify(file_info, db):
+                            record_deleted(file_info.id)
                             stats['deleted'] += 1
                             stats['details'].append({
                                 'filename': file_info.imagefilename,
@@ -594,31 +1394,51 @@ class VersionManager:
                         continue
 
                     # 如果ai_metadata为空或没有有效期信息，使用AI判断
-                    if not file_info.ai_analysis_result or not expiration_info:
+                    if not file_info.has_ai_analysis or not expiration_info:
                         logger.info(f"文档 {file_info.imagefilename} 没有有效期元数据，使用AI判断")
 
-                        # 下载并提取文档预览
-                        preview = self.download_and_extract_document_preview(file_info, preview_length=600)
+                        preview_candidates.append(file_info)
+
+                except Exception as e:
+                    logger.error(f"处理文档有效期检查时发生错误 {file_info.imagefilename}: {e}")
+                    stats['errors'] += 1
+                    continue
+
+            # 下载并提取文档预览
+            ai_candidates = []
+            previews = self.download_previews(preview_candidates, preview_length=600)
+            for file_info, preview in zip(preview_candidates, previews):
+                if not preview:
+                    logger.warning(f"无法获取文档预览，跳过: {file_info.imagefilename}")
+                    stats['errors'] += 1
+                    continue
 
-                        if not preview:
-                            logger.warning(f"无法获取文档预览，跳过: {file_info.imagefilename}")
-                            stats['errors'] += 1
-                            continue
+                ai_candidates.append((file_info, preview))
 
-                        # 使用AI判断是否过期
-                        is_expired_ai, reasoning = self.check_document_expiration_by_ai(file_info, preview)
+            if not ai_candidates:
+                return stats
 
-                        if is_expired_ai:
-                            stats['expired_by_ai'] += 1
+            if not self.client:
+                logger.error("OpenAI客户端未初始化")
+                return stats
 
-                            # 删除过期文档
-                            if self.delete_document_from_dify(file_info, db):
-                                stats['deleted'] += 1
-                                stats['details'].append({
-                                    'filename': file_info.imagefilename,
-                                    'reasoning': reasoning,
-                                    'check_method': 'ai'
-                                })
+            # 使用AI判断是否过期
+            verdicts = self.check_expiration_batch(ai_candidates, self.expiration_batch_size)
+
+            for (file_info, _), (is_expired_ai, reasoning) in zip(ai_candidates, verdicts):
+                try:
+                    if is_expired_ai:
+                        stats['expired_by_ai'] += 1
+
+                        # 删除过期文档
+                        if self.delete_document_from_dify(file_info, db):
+                            record_deleted(file_info.id)
+                            stats['deleted'] += 1
+                            stats['details'].append({
+                                'filename': file_info.imagefilename,
+                                'reasoning': reasoning,
+                                'check_method': 'ai'
+                            })
 
                 except Exception as e:
                     logger.error(f"处理文档有效期检查时发生错误 {file_info.imagefilename}: {e}")
@@ -632,6 +1452,9 @@ class VersionManager:
             stats['errors'] += 1
             return stats
 
+        finally:
+            self.mark_documents_deleted(db, deleted_ids)
+
 
 # 创建全局实例
 version_manager = VersionManager()
@@ -1,8 +1,14 @@
-﻿from celery import Celery
+﻿from celery import Celery, group
 from celery.signals import worker_ready
+import hashlib
 import logging
+import time
 from datetime import datetime
-from sqlalchemy.orm import Session
+from typing import Optional
+from redis import Redis
+from redis.exceptions import RedisError
+from sqlalchemy import event
+from sqlalchemy.orm import Session, load_only
 from database import get_db_session
 from models import OAFileInfo, ProcessingLog, ProcessingStatus, BusinessCategory
 from services.s3_service import s3_service
@@ -10,11 +16,11 @@ from services.decryption_service import decryption_service
 from services.api_document_parser import api_document_parser
 from services.ai_analyzer import ai_analyzer
 from services.dify_service import dify_service, multi_kb_manager
-from services.file_filter import file_filter
+from services.file_filter import get_file_filter
 from services.version_manager import version_manager
 from services.dat_importer import import_dat_file, get_latest_dat_file
 from config import settings
-import json
+from utils.json_utils import json_dumps, json_loads
 
 # 配置日志
 logging.basicConfig(level=logging.INFO)
@@ -36,13 +42,61 @@ app.conf.update(
         'tasks.document_processor.approve_document': {'queue': 'document_processing'},
         'tasks.document_processor.import_dat_file_task': {'queue': 'data_import'},
     },
-    task_default_queue='document_processing'
+    task_default_queue='document_processing',
+    # 文档处理为长耗时I/O任务：每个进程只预取一个任务，执行完成后再确认，避免短任务排在长任务之后
+    worker_prefetch_multiplier=1,
+    task_acks_late=True,
+    task_reject_on_worker_lost=True,
+    # 大文件解析后内存难以回收，定期重启子进程
+    worker_max_tasks_per_child=50
 )
 
-def log_processing_step(file_id: str, step: str, status: str, message: str, duration: int = None):
-    """记录处理步骤日志"""
+# 待审核文档解析内容缓存：人工审核通过时直接复用，无需再次从S3下载、解密和解析
+APPROVAL_CONTENT_CACHE_PREFIX = "approval_content:"
+_content_cache_redis = None
+
+def _get_content_cache() -> Redis:
+    """获取解析内容缓存使用的Redis客户端（首次使用时创建）"""
+    global _content_cache_redis
+    if _content_cache_redis is None:
+        _content_cache_redis = Redis.from_url(
+            settings.redis_url,
+            socket_connect_timeout=3,
+            socket_timeout=3,
+            decode_responses=True
+        )
+    return _content_cache_redis
+
+def cache_approval_content(file_id: str, content: str):
+    """缓存待审核文档的解析内容，失败时仅记录警告"""
+    ttl = getattr(settings, 'approval_content_cache_ttl', 259200)
+    if ttl <= 0 or not content:
+        return
+    try:
+        _get_content_cache().setex(APPROVAL_CONTENT_CACHE_PREFIX + file_id, ttl, content)
+    except RedisError as e:
+        logger.warning(f"缓存待审核文档内容失败 {file_id}: {e}")
+
+def pop_approval_content(file_id: str) -> Optional[str]:
+    """取出并删除缓存的待审核文档解析内容，未命中或Redis不可用时返回None"""
+    if getattr(settings, 'approval_content_cache_ttl', 259200) <= 0:
+        return None
+    try:
+        with _get_content_cache().pipeline(transaction=False) as pipe:
+            pipe.get(APPROVAL_CONTENT_CACHE_PREFIX + file_id)
+            pipe.delete(APPROVAL_CONTENT_CACHE_PREFIX + file_id)
+            content, _ = pipe.execute()
+        return content
+    except RedisError as e:
+        logger.warning(f"读取待审核文档内容缓存失败 {file_id}: {e}")
+        return None
+
+# 会话中暂存的处理日志（Session.info 键）
+PENDING_LOGS_KEY = 'pending_processing_logs'
+
+def log_processing_step(db: Session, file_id: str, step: str, status: str, message: str, duration: int = None):
+    """记录处理步骤日志（暂存在调用方会话中，提交时一次批量写入）"""
     try:
-        db = get_db_session()
         log_entry = ProcessingLog(
             file_id=file_id,
             step=step,
@@ -50,45 +104,82 @@ def log_processing_step(file_id: str, step: str, status: str, message: str, dura
             message=message,
             duration_seconds=duration
         )
-        db.add(log_entry)
-        db.commit()
-        db.close()
+        db.info.setdefault(PENDING_LOGS_KEY, []).append(log_entry)
     except Exception as e:
         logger.error(f"记录处理日志失败: {e}")
 
-def update_file_status(file_id: str, status: ProcessingStatus, message: str = None):
-    """更新文件处理状态"""
-    try:
-        db = get_db_session()
-        file_info = db.query(OAFileInfo).filter(OAFileInfo.imagefileid == file_id).first()
-        if file_info:
-            file_info.processing_status = status
-            if message:
-                file_info.processing_message = message
-
-            if status == ProcessingStatus.PENDING:
-                file_info.processing_started_at = datetime.now()
-            elif status in [ProcessingStatus.COMPLETED, ProcessingStatus.FAILED, ProcessingStatus.SKIPPED]:
-                file_info.processing_completed_at = datetime.now()
+@event.listens_for(Session, 'before_commit')
+def _write_pending_logs(session: Session):
+    """提交前将暂存的处理日志以单条批量INSERT写入（无需逐行返回主键）"""
+    pending_logs = session.info.pop(PENDING_LOGS_KEY, None)
+    if pending_logs:
+        session.bulk_save_objects(pending_logs)
+
+# 需要立即提交的状态：开始处理（占用该文件，防止被重复处理）以及各结束状态；
+# 解密、解析、分析等中间状态只更新内存中的对象，随下一次提交一并落库
+COMMIT_ON_STATUSES = frozenset({
+    ProcessingStatus.DOWNLOADING,
+    ProcessingStatus.AWAITING_APPROVAL,
+    ProcessingStatus.COMPLETED,
+    ProcessingStatus.FAILED,
+    ProcessingStatus.SKIPPED,
+})
+
+# 处理中的状态：Worker 中途退出后任务会重新投递（task_acks_late），此时文件可能停在其中任一状态
+IN_FLIGHT_STATUSES = frozenset({
+    ProcessingStatus.DOWNLOADING,
+    ProcessingStatus.DECRYPTING,
+    ProcessingStatus.PARSING,
+    ProcessingStatus.ANALYZING,
+})
+
+def update_file_status(db: Session, file_info: OAFileInfo, status: ProcessingStatus, message: str = None,
+                       commit: Optional[bool] = None):
+    """
+    更新已加载文件对象的处理状态
 
+    Args:
+        commit: 是否立即提交，默认仅在 COMMIT_ON_STATUSES 中的状态提交
+    """
+    try:
+        file_info.processing_status = status
+        if message:
+            file_info.processing_message = message
+
+        if status == ProcessingStatus.PENDING:
+            file_info.processing_started_at = datetime.now()
+        elif status in [ProcessingStatus.COMPLETED, ProcessingStatus.FAILED, ProcessingStatus.SKIPPED]:
+            file_info.processing_completed_at = datetime.now()
+
+        if commit is None:
+            commit = status in COMMIT_ON_STATUSES
+        if commit:
             db.commit()
-        db.close()
     except Exception as e:
+        db.rollback()
         logger.error(f"更新文件状态失败: {e}")
 
-def can_process_file(file_id: str) -> bool:
-    """检查文件是否可以被处理（防止重复处理已跳过的文档）"""
+def can_process_file(db: Session, file_id: str, claimed: bool = False) -> bool:
+    """
+    检查文件是否可以被处理（防止重复处理已跳过的文档）
+
+    Args:
+        claimed: 是否已由批量任务领取（领取时状态已置为 DOWNLOADING），或为重新投递的任务；
+                 此时文件处于任一处理中状态均可继续处理
+    """
     try:
-        db = get_db_session()
         file_info = db.query(OAFileInfo).filter(OAFileInfo.imagefileid == file_id).first()
-        db.close()
 
         if not file_info:
             logger.warning(f"文件不存在: {file_id}")
             return False
 
-        # 只有 PENDING 状态的文档才能被处理
-        if file_info.processing_status != ProcessingStatus.PENDING:
+        # 只有 PENDING 状态（或已被领取、处于处理中状态）的文档才能被处理
+        if claimed:
+            can_process = file_info.processing_status in IN_FLIGHT_STATUSES
+        else:
+            can_process = file_info.processing_status == ProcessingStatus.PENDING
+        if not can_process:
             logger.info(f"文件 {file_id} 状态为 {file_info.processing_status.value}，跳过处理")
             return False
 
@@ -98,26 +189,34 @@ def can_process_file(file_id: str) -> bool:
         return False
 
 @app.task(bind=True, max_retries=3, default_retry_delay=300)
-def process_document(self, file_id: str):
+def process_document(self, file_id: str, claimed: bool = False):
     """
     处理单个文档的完整流程 - 支持多知识库和分类映射
     
     Args:
         file_id: 文件ID
+        claimed: 是否已由批量任务领取
     """
-    start_time = datetime.now()
+    start_time = time.monotonic()
     db = None
+    file_info = None
     
     try:
         logger.info(f"开始处理文档: {file_id}")
 
+        # 获取数据库会话（整个处理流程共用，日志与状态更新均写入该会话）
+        db = get_db_session()
+
+        # Worker 中途退出后重新投递的任务：文件停留在中断时的处理中状态，从头重新处理
+        if (self.request.delivery_info or {}).get('redelivered'):
+            logger.info(f"文档 {file_id} 的任务为重新投递，继续处理")
+            claimed = True
+
         # 检查文件是否可以被处理（防止重复处理已跳过的文档）
-        if not can_process_file(file_id):
+        if not can_process_file(db, file_id, claimed):
             logger.info(f"文档 {file_id} 无法处理，可能已被跳过或正在处理中")
             return {'success': False, 'error': '文档无法处理，状态不正确'}
 
-        # 获取数据库会话
-        db = get_db_session()
         file_info = db.query(OAFileInfo).filter(OAFileInfo.imagefileid == file_id).first()
 
         if not file_info:
@@ -126,12 +225,12 @@ def process_document(self, file_id: str):
         
         # 步骤0: 文件筛选检查
         # logger.info(f"开始文件筛选检查: {file_id}")
-        # filter_result = file_filter.should_process_file(file_info)
+        # filter_result = get_file_filter().should_process_file(file_info)
 
         # if not filter_result['should_process']:
         #     logger.info(f"文件筛选未通过: {file_id} - {filter_result['skip_reason']}")
-        #     update_file_status(file_id, ProcessingStatus.SKIPPED, f"筛选未通过: {filter_result['skip_reason']}")
-        #     log_processing_step(file_id, "filter_check", "skipped",
+        #     update_file_status(db, file_info, ProcessingStatus.SKIPPED, f"筛选未通过: {filter_result['skip_reason']}")
+        #     log_processing_step(db, file_id, "filter_check", "skipped",
         #                       f"筛选未通过: {filter_result['skip_reason']} (应用筛选器: {', '.join(filter_result['filters_applied'])})")
         #     return {
         #         'success': False,
@@ -140,78 +239,94 @@ def process_document(self, file_id: str):
         #     }
 
         # logger.info(f"文件筛选通过: {file_id} (应用筛选器: {', '.join(filter_result['filters_applied'])})")
-        # log_processing_step(file_id, "filter_check", "success",
+        # log_processing_step(db, file_id, "filter_check", "success",
         #                   f"筛选通过 (应用筛选器: {', '.join(filter_result['filters_applied'])})")
         
-        update_file_status(file_id, ProcessingStatus.DOWNLOADING, "开始下载")
+        update_file_status(db, file_info, ProcessingStatus.DOWNLOADING, "开始下载")
         
         # 步骤1: 从S3下载文档
-        step_start = datetime.now()
+        step_start = time.monotonic()
         try:
             file_data = s3_service.download_file(file_info.tokenkey)
-            step_duration = (datetime.now() - step_start).seconds
-            log_processing_step(file_id, "download", "success",
+            step_duration = int(time.monotonic() - step_start)
+            log_processing_step(db, file_id, "download", "success",
                               f"下载成功，大小: {len(file_data)} 字节", step_duration)
 
         except Exception as e:
-            step_duration = (datetime.now() - step_start).seconds
+            step_duration = int(time.monotonic() - step_start)
             error_msg = f"下载失败: {str(e)}"
-            log_processing_step(file_id, "download", "failed", error_msg, step_duration)
-            update_file_status(file_id, ProcessingStatus.FAILED, error_msg)
+            log_processing_step(db, file_id, "download", "failed", error_msg, step_duration)
+            update_file_status(db, file_info, ProcessingStatus.FAILED, error_msg)
             file_info.error_count = (file_info.error_count or 0) + 1
             file_info.last_error = error_msg
             db.commit()
             raise
         
-        update_file_status(file_id, ProcessingStatus.DECRYPTING, "开始解密")
+        update_file_status(db, file_info, ProcessingStatus.DECRYPTING, "开始解密")
         
         # 步骤2: 解密文档
-        step_start = datetime.now()
+        step_start = time.monotonic()
         try:
             if file_info.asecode:
                 decrypted_data = decryption_service.decrypt_binary_data(file_data, file_info.asecode)
             else:
                 decrypted_data = file_data  # 如果没有解密密码，直接使用原数据
+            # 解密后不再需要原始数据，尽早释放
+            del file_data
             
-            step_duration = (datetime.now() - step_start).seconds
-            log_processing_step(file_id, "decrypt", "success", 
+            step_duration = int(time.monotonic() - step_start)
+            log_processing_step(db, file_id, "decrypt", "success", 
                               f"解密成功，大小: {len(decrypted_data)} 字节", step_duration)
         except Exception as e:
-            step_duration = (datetime.now() - step_start).seconds
+            step_duration = int(time.monotonic() - step_start)
             error_msg = f"解密失败: {str(e)}"
-            log_processing_step(file_id, "decrypt", "failed", error_msg, step_duration)
-            update_file_status(file_id, ProcessingStatus.FAILED, error_msg)
+            log_processing_step(db, file_id, "decrypt", "failed", error_msg, step_duration)
+            update_file_status(db, file_info, ProcessingStatus.FAILED, error_msg)
             file_info.error_count = (file_info.error_count or 0) + 1
             file_info.last_error = error_msg
             db.commit()
             raise
+
+        # 按解密后的文件内容去重：改名后重新上传的相同文件也能识别
+        content_sha256 = hashlib.sha256(decrypted_data).hexdigest()
+        file_filter = get_file_filter()
+        if file_filter.config['enable_duplicate_filter']:
+            duplicate_check = file_filter.check_content_duplicate(file_info, content_sha256, db)
+            if duplicate_check['is_duplicate']:
+                skip_reason = f"文件重复: {duplicate_check['reason']}"
+                file_info.content_sha256 = content_sha256
+                log_processing_step(db, file_id, "duplicate_check", "skipped", skip_reason)
+                update_file_status(db, file_info, ProcessingStatus.SKIPPED, skip_reason)
+                return {'success': False, 'error': skip_reason, 'duplicate_info': duplicate_check}
+        file_info.content_sha256 = content_sha256
         
-        update_file_status(file_id, ProcessingStatus.PARSING, "开始解析")
+        # 内容哈希需尽快对其他任务可见，供并发处理时的重复检查使用
+        update_file_status(db, file_info, ProcessingStatus.PARSING, "开始解析", commit=True)
         
         # 步骤3: 解析文档内容
-        step_start = datetime.now()
+        step_start = time.monotonic()
         try:
-            # 用于存储最终处理的文件内容和名称（用于后续Dify上传）
-            final_file_content = decrypted_data
+            # 最终文件名（用于后续Dify上传）
             final_filename = file_info.imagefilename
             
             # 如果是ZIP文件，先提取唯一文件的二进制内容
             if file_info.is_zip :
-                extracted_content = decryption_service.extract_zip_files(decrypted_data)
-                parse_result = api_document_parser.parse_document(extracted_content, file_info.imagefilename)
-                # 更新为提取出的文件内容和最终文件名（来自数据库字段）
-                final_file_content = extracted_content
-                final_filename = file_info.imagefilename
-                logger.info(f"ZIP文件处理：使用单一文件 {final_filename} ({len(final_file_content)} 字节) 用于知识库上传")
+                parse_data = decryption_service.extract_zip_files(decrypted_data)
+                logger.info(f"ZIP文件处理：使用单一文件 {final_filename} ({len(parse_data)} 字节) 用于知识库上传")
             else:
-                parse_result = api_document_parser.parse_document(decrypted_data, file_info.imagefilename)
+                parse_data = decrypted_data
+            # 后续步骤只使用解析出的文本，解析前释放解密数据，解析后释放文件内容，
+            # 避免文件数据在AI分析和知识库上传期间一直占用内存
+            del decrypted_data
+            parse_result = api_document_parser.parse_document(parse_data, final_filename)
+            del parse_data
             
-            step_duration = (datetime.now() - step_start).seconds
+            step_duration = int(time.monotonic() - step_start)
             
             if not parse_result['success']:
                 error_msg = f"解析失败: {parse_result['error']}"
-                log_processing_step(file_id, "parse", "failed", error_msg, step_duration)
-                update_file_status(file_id, ProcessingStatus.FAILED, error_msg)
+                log_processing_step(db, file_id, "parse", "failed", error_msg, step_duration)
+                update_file_status(db, file_info, ProcessingStatus.FAILED, error_msg)
                 file_info.error_count = (file_info.error_count or 0) + 1
                 file_info.last_error = error_msg
                 db.commit()
@@ -220,22 +335,22 @@ def process_document(self, file_id: str):
             content = parse_result['content']
             metadata = parse_result['metadata']
             
-            log_processing_step(file_id, "parse", "success", 
+            log_processing_step(db, file_id, "parse", "success", 
                               f"解析成功，内容长度: {len(content)} 字符", step_duration)
         except Exception as e:
-            step_duration = (datetime.now() - step_start).seconds
+            step_duration = int(time.monotonic() - step_start)
             error_msg = f"解析失败: {str(e)}"
-            log_processing_step(file_id, "parse", "failed", error_msg, step_duration)
-            update_file_status(file_id, ProcessingStatus.FAILED, error_msg)
+            log_processing_step(db, file_id, "parse", "failed", error_msg, step_duration)
+            update_file_status(db, file_info, ProcessingStatus.FAILED, error_msg)
             file_info.error_count = (file_info.error_count or 0) + 1
             file_info.last_error = error_msg
             db.commit()
             raise
         
-        update_file_status(file_id, ProcessingStatus.ANALYZING, "AI分析中")
+        update_file_status(db, file_info, ProcessingStatus.ANALYZING, "AI分析中")
         
         # 步骤4: 增强版AI分析 - 支持分类映射和多知识库
-        step_start = datetime.now()
+        step_start = time.monotonic()
         target_knowledge_base = None
         try:
             # 构建文件信息字典(从数据库字段)
@@ -253,22 +368,26 @@ def process_document(self, file_id: str):
                 content, file_info.imagefilename, file_info_dict, metadata
             )
             
-            step_duration = (datetime.now() - step_start).seconds
+            step_duration = int(time.monotonic() - step_start)
             
             kb_info = target_knowledge_base.name if target_knowledge_base else "未找到目标知识库"
-            log_processing_step(file_id, "analyze", "success", 
+            log_processing_step(db, file_id, "analyze", "success", 
                               f"分析完成 [分类: {file_info.business_category.value}]，适合知识库: {analysis_result['suitable_for_kb']}, 目标知识库: {kb_info}", 
                               step_duration)
             
             # 保存分析结果
-            file_info.ai_analysis_result = json.dumps(analysis_result, ensure_ascii=False)
+            file_info.ai_analysis_result = json_dumps(analysis_result)
             file_info.ai_confidence_score = analysis_result['confidence_score']
             file_info.should_add_to_kb = analysis_result['suitable_for_kb']
+            # 有效期单独存列，供有效期检查直接按日期查询
+            ai_metadata = analysis_result.get('ai_metadata') or {}
+            file_info.expiration_date_parsed, file_info.expiration_is_permanent = \
+                version_manager.parse_expiration_date(ai_metadata.get('expiration_date'))
             
         except Exception as e:
-            step_duration = (datetime.now() - step_start).seconds
+            step_duration = int(time.monotonic() - step_start)
             error_msg = f"AI分析失败: {str(e)}"
-            log_processing_step(file_id, "analyze", "failed", error_msg, step_duration)
+            log_processing_step(db, file_id, "analyze", "failed", error_msg, step_duration)
             # AI分析失败不算致命错误，继续后续处理
             analysis_result = {
                 'suitable_for_kb': False,
@@ -277,7 +396,7 @@ def process_document(self, file_id: str):
                 'analysis_method': 'failed',
                 'category': file_info.business_category.value if file_info.business_category else 'unknown'
             }
-            file_info.ai_analysis_result = json.dumps(analysis_result, ensure_ascii=False)
+            file_info.ai_analysis_result = json_dumps(analysis_result)
             file_info.ai_confidence_score = 0
             file_info.should_add_to_kb = False
         
@@ -288,7 +407,7 @@ def process_document(self, file_id: str):
         
         if analysis_result['suitable_for_kb'] and analysis_result['confidence_score'] >= auto_approve_threshold:
             # 高置信度，直接加入知识库
-            step_start = datetime.now()
+            step_start = time.monotonic()
             try:
                 # 查询对应的知识库并创建Dify服务对象
                 if target_knowledge_base:
@@ -308,46 +427,47 @@ def process_document(self, file_id: str):
                     }
                 )
                 
-                step_duration = (datetime.now() - step_start).seconds
+                step_duration = int(time.monotonic() - step_start)
                 
                 if dify_result['success']:
                     file_info.document_id = dify_result.get('document_id')
                     kb_name = dify_result.get('knowledge_base_name', 'unknown')
-                    update_file_status(file_id, ProcessingStatus.COMPLETED, f"已成功加入知识库: {kb_name}")
-                    log_processing_step(file_id, "add_to_kb", "success", 
+                    update_file_status(db, file_info, ProcessingStatus.COMPLETED, f"已成功加入知识库: {kb_name}")
+                    log_processing_step(db, file_id, "add_to_kb", "success", 
                                       f"成功加入知识库 [{kb_name}]: {dify_result.get('document_id')}", 
                                       step_duration)
                 else:
                     error_msg = f"加入知识库失败: {dify_result['error']}"
-                    update_file_status(file_id, ProcessingStatus.FAILED, error_msg)
-                    log_processing_step(file_id, "add_to_kb", "failed", error_msg, step_duration)
+                    update_file_status(db, file_info, ProcessingStatus.FAILED, error_msg)
+                    log_processing_step(db, file_id, "add_to_kb", "failed", error_msg, step_duration)
                     file_info.error_count = (file_info.error_count or 0) + 1
                     file_info.last_error = error_msg
                 
             except Exception as e:
-                step_duration = (datetime.now() - step_start).seconds
+                step_duration = int(time.monotonic() - step_start)
                 error_msg = f"加入知识库异常: {str(e)}"
-                log_processing_step(file_id, "add_to_kb", "failed", error_msg, step_duration)
-                update_file_status(file_id, ProcessingStatus.FAILED, error_msg)
+                log_processing_step(db, file_id, "add_to_kb", "failed", error_msg, step_duration)
+                update_file_status(db, file_info, ProcessingStatus.FAILED, error_msg)
                 file_info.error_count = (file_info.error_count or 0) + 1
                 file_info.last_error = error_msg
         
         elif analysis_result['suitable_for_kb'] and analysis_result['confidence_score'] >= min_confidence:
             # 中等置信度，需要人工审核
             kb_info = target_knowledge_base.name if target_knowledge_base else "默认知识库"
-            update_file_status(file_id, ProcessingStatus.AWAITING_APPROVAL, f"等待人工审核 (目标知识库: {kb_info})")
-            log_processing_step(file_id, "review", "pending", 
+            cache_approval_content(file_id, content)
+            update_file_status(db, file_info, ProcessingStatus.AWAITING_APPROVAL, f"等待人工审核 (目标知识库: {kb_info})")
+            log_processing_step(db, file_id, "review", "pending", 
                               f"置信度{analysis_result['confidence_score']}%，需要人工审核 (目标知识库: {kb_info})")
         
         else:
             # 低置信度，跳过
-            update_file_status(file_id, ProcessingStatus.SKIPPED, 
+            update_file_status(db, file_info, ProcessingStatus.SKIPPED, 
                              f"置信度过低({analysis_result['confidence_score']}%)，已跳过")
-            log_processing_step(file_id, "skip", "success", "置信度过低，自动跳过")
+            log_processing_step(db, file_id, "skip", "success", "置信度过低，自动跳过")
         
         db.commit()
         
-        total_duration = (datetime.now() - start_time).seconds
+        total_duration = int(time.monotonic() - start_time)
         logger.info(f"文档处理完成: {file_id}, 耗时: {total_duration}秒, 目标知识库: {target_knowledge_base.name if target_knowledge_base else 'None'}")
         
         return {
@@ -370,7 +490,7 @@ def process_document(self, file_id: str):
         if db and file_info:
             file_info.error_count = (file_info.error_count or 0) + 1
             file_info.last_error = str(e)
-            update_file_status(file_id, ProcessingStatus.FAILED, f"未知错误: {str(e)}")
+            update_file_status(db, file_info, ProcessingStatus.FAILED, f"未知错误: {str(e)}")
             db.commit()
         
         # 重试机制
@@ -384,6 +504,17 @@ def process_document(self, file_id: str):
         if db:
             db.close()
 
+# 批量预筛选用到的文件字段（文件筛选器读取的字段及提交任务时记录的字段）
+BATCH_FILTER_COLUMNS = (
+    OAFileInfo.imagefileid,
+    OAFileInfo.imagefilename,
+    OAFileInfo.business_category,
+    OAFileInfo.is_zw,
+    OAFileInfo.filesize,
+    OAFileInfo.tokenkey,
+    OAFileInfo.content_sha256,
+)
+
 @app.task(name='batch_process_documents')
 def batch_process_documents(limit: int = 10):
     """
@@ -393,65 +524,86 @@ def batch_process_documents(limit: int = 10):
         limit: 每次处理的文档数量限制
     """
     try:
-        db = get_db_session()
-        
-        # 查询待处理的正文文档，排除已跳过的文档
-        pending_files = db.query(OAFileInfo).filter(
-            OAFileInfo.is_zw == True,
-            OAFileInfo.processing_status == ProcessingStatus.PENDING
-        ).limit(limit * 2).all()  # 获取更多文件用于预筛选
-
-        # 预筛选文件，只处理通过筛选的文件
-        filtered_files = []
-        skipped_count = 0
-
-        for file_info in pending_files:
-            if len(filtered_files) >= limit:
-                break
-
-            # 进行基础筛选（不包含文件数据的筛选）
-            filter_result = file_filter.should_process_file(file_info)
-
-            if filter_result['should_process']:
-                filtered_files.append(file_info)
-            else:
-                # 直接标记为跳过
-                try:
-                    update_file_status(file_info.imagefileid, ProcessingStatus.SKIPPED,
-                                     f"批量处理筛选未通过: {filter_result['skip_reason']}")
-                    log_processing_step(file_info.imagefileid, "batch_filter", "skipped",
-                                      f"批量筛选: {filter_result['skip_reason']}")
-                    skipped_count += 1
-                    logger.info(f"批量处理跳过文件: {file_info.imagefilename} - {filter_result['skip_reason']}")
-                except Exception as e:
-                    logger.error(f"更新跳过状态失败 {file_info.imagefileid}: {e}")
-
-        logger.info(f"批量处理预筛选完成: 原始 {len(pending_files)} 个，筛选后 {len(filtered_files)} 个，跳过 {skipped_count} 个")
-        pending_files = filtered_files
-        
-        logger.info(f"找到 {len(pending_files)} 个待处理文档")
-        
-        results = []
-        for file_info in pending_files:
-            try:
-                # 异步处理每个文档
-                task = process_document.delay(file_info.imagefileid)
-                results.append({
+        with get_db_session() as db:
+            # 查询待处理的正文文档，排除已跳过的文档
+            # 只加载筛选和提交任务用到的字段，不读取AI分析结果、错误信息等大字段；
+            # FOR UPDATE SKIP LOCKED 锁定候选行直到提交，并发的批量任务不会取到同一批文件
+            pending_files = db.query(OAFileInfo).options(
+                load_only(*BATCH_FILTER_COLUMNS)
+            ).filter(
+                OAFileInfo.is_zw == True,
+                OAFileInfo.processing_status == ProcessingStatus.PENDING
+            ).limit(limit * 2).with_for_update(skip_locked=True).all()  # 获取更多文件用于预筛选
+
+            # 预筛选文件，只处理通过筛选的文件
+            filtered_files = []
+            skipped_count = 0
+
+            # 进行基础筛选（不包含文件数据的筛选），使用本任务的会话：
+            # 另开会话提交会在共用连接上提前提交本事务，释放候选行的行锁
+            filter_results = get_file_filter().should_process_file_batch(pending_files, db=db)
+            for file_info, filter_result in filter_results:
+                if len(filtered_files) >= limit:
+                    break
+
+                if filter_result['should_process']:
+                    filtered_files.append(file_info)
+                else:
+                    # 直接标记为跳过
+                    try:
+                        update_file_status(db, file_info, ProcessingStatus.SKIPPED,
+                                         f"批量处理筛选未通过: {filter_result['skip_reason']}", commit=False)
+                        log_processing_step(db, file_info.imagefileid, "batch_filter", "skipped",
+                                          f"批量筛选: {filter_result['skip_reason']}")
+                        skipped_count += 1
+                        logger.info(f"批量处理跳过文件: {file_info.imagefilename} - {filter_result['skip_reason']}")
+                    except Exception as e:
+                        logger.error(f"更新跳过状态失败 {file_info.imagefileid}: {e}")
+            filter_results.close()
+
+            logger.info(f"批量处理预筛选完成: 原始 {len(pending_files)} 个，筛选后 {len(filtered_files)} 个，跳过 {skipped_count} 个")
+
+            # 领取通过筛选的文件：与跳过状态一起提交后释放行锁，之后其他批量任务不会再取到这些文件
+            claimed_files = []
+            for file_info in filtered_files:
+                update_file_status(db, file_info, ProcessingStatus.DOWNLOADING, "已加入处理队列", commit=False)
+                claimed_files.append({
                     'file_id': file_info.imagefileid,
-                    'task_id': task.id,
                     'filename': file_info.imagefilename,
                     'business_category': file_info.business_category.value if file_info.business_category else 'unknown'
                 })
-                logger.info(f"已提交处理任务: {file_info.imagefileid} [分类: {file_info.business_category.value if file_info.business_category else 'unknown'}]")
-            except Exception as e:
-                logger.error(f"提交处理任务失败 {file_info.imagefileid}: {e}")
-                results.append({
-                    'file_id': file_info.imagefileid,
-                    'error': str(e)
-                })
+            db.commit()
         
-        db.close()
+            logger.info(f"找到 {len(claimed_files)} 个待处理文档")
         
+            results = []
+            if claimed_files:
+                try:
+                    # 以group一次性提交所有处理任务，broker写入合并为一批
+                    group_result = group(
+                        process_document.s(item['file_id'], claimed=True) for item in claimed_files
+                    ).apply_async(queue='document_processing')
+
+                    for item, task in zip(claimed_files, group_result.children):
+                        results.append({**item, 'task_id': task.id})
+                        logger.info(f"已提交处理任务: {item['file_id']} [分类: {item['business_category']}]")
+                except Exception as e:
+                    logger.error(f"批量提交处理任务失败: {e}")
+                    # 任务未能提交，退回待处理状态，等待下次批量处理
+                    claimed_ids = [item['file_id'] for item in claimed_files]
+                    db.query(OAFileInfo).filter(
+                        OAFileInfo.imagefileid.in_(claimed_ids),
+                        OAFileInfo.processing_status == ProcessingStatus.DOWNLOADING
+                    ).update({
+                        OAFileInfo.processing_status: ProcessingStatus.PENDING,
+                        OAFileInfo.processing_message: None
+                    }, synchronize_session=False)
+                    db.commit()
+                    results = [
+                        {'file_id': file_id, 'error': str(e)}
+                        for file_id in claimed_ids
+                    ]
+
         return {
             'success': True,
             'processed_count': len(results),
@@ -485,46 +637,53 @@ def approve_document(file_id: str, approved: bool, reviewer_comment: str = ""):
         if file_info.processing_status != ProcessingStatus.AWAITING_APPROVAL:
             return {'success': False, 'error': '文档状态不正确，无法审核'}
 
+        # 自动处理时缓存的解析内容（审核通过或拒绝后均不再需要）
+        cached_content = pop_approval_content(file_id)
+
         if approved:
             # 审核通过，加入知识库
             try:
                 # 重新解析分析结果
-                analysis_result = json.loads(file_info.ai_analysis_result or '{}')
+                analysis_result = json_loads(file_info.ai_analysis_result or '{}')
 
-                # 重新从S3下载文档内容并解析
-                try:
-                    file_data = s3_service.download_file(file_info.tokenkey)
-                    logger.info(f"重新下载文件成功，准备解析并加入知识库: {file_info.imagefilename}")
-
-                    # 解密文档
-                    if file_info.asecode:
-                        decrypted_data = decryption_service.decrypt_binary_data(file_data, file_info.asecode)
-                    else:
-                        decrypted_data = file_data
-
-                    # 解析文档内容（与自动流程保持一致：ZIP需先解压取唯一文件内容）
-                    if file_info.is_zip:
-                        extracted_content = decryption_service.extract_zip_files(decrypted_data)
-                        parse_result = api_document_parser.parse_document(extracted_content, file_info.imagefilename)
-                    else:
-                        parse_result = api_document_parser.parse_document(decrypted_data, file_info.imagefilename)
-
-                    if not parse_result['success']:
-                        error_msg = f"重新解析文档失败: {parse_result['error']}"
+                if cached_content is not None:
+                    content = cached_content
+                    logger.info(f"使用缓存的解析内容加入知识库: {file_info.imagefilename}")
+                else:
+                    # 缓存未命中时重新从S3下载文档内容并解析
+                    try:
+                        file_data = s3_service.download_file(file_info.tokenkey)
+                        logger.info(f"重新下载文件成功，准备解析并加入知识库: {file_info.imagefilename}")
+
+                        # 解密文档
+                        if file_info.asecode:
+                            decrypted_data = decryption_service.decrypt_binary_data(file_data, file_info.asecode)
+                        else:
+                            decrypted_data = file_data
+
+                        # 解析文档内容（与自动流程保持一致：ZIP需先解压取唯一文件内容）
+                        if file_info.is_zip:
+                            extracted_content = decryption_service.extract_zip_files(decrypted_data)
+                            parse_result = api_document_parser.parse_document(extracted_content, file_info.imagefilename)
+                        else:
+                            parse_result = api_document_parser.parse_document(decrypted_data, file_info.imagefilename)
+
+                        if not parse_result['success']:
+                            error_msg = f"重新解析文档失败: {parse_result['error']}"
+                            logger.error(error_msg)
+                            log_processing_step(db, file_id, "manual_approve", "failed", error_msg)
+                            update_file_status(db, file_info, ProcessingStatus.FAILED, error_msg)
+                            return {'success': False, 'error': error_msg}
+
+                        content = parse_result['content']
+
+                    except Exception as e:
+                        error_msg = f"重新处理文件失败: {str(e)}"
                         logger.error(error_msg)
-                        update_file_status(file_id, ProcessingStatus.FAILED, error_msg)
-                        log_processing_step(file_id, "manual_approve", "failed", error_msg)
+                        log_processing_step(db, file_id, "manual_approve", "failed", error_msg)
+                        update_file_status(db, file_info, ProcessingStatus.FAILED, error_msg)
                         return {'success': False, 'error': error_msg}
 
-                    content = parse_result['content']
-
-                except Exception as e:
-                    error_msg = f"重新处理文件失败: {str(e)}"
-                    logger.error(error_msg)
-                    update_file_status(file_id, ProcessingStatus.FAILED, error_msg)
-                    log_processing_step(file_id, "manual_approve", "failed", error_msg)
-                    return {'success': False, 'error': error_msg}
-
                 # 根据业务分类查询对应的知识库并创建Dify服务对象
                 target_kb = ai_analyzer.get_target_knowledge_base(file_info.business_category, db)
                 if target_kb:
@@ -548,24 +707,24 @@ def approve_document(file_id: str, approved: bool, reviewer_comment: str = ""):
                 if dify_result['success']:
                     file_info.document_id = dify_result.get('document_id')
                     kb_name = dify_result.get('knowledge_base_name', target_kb.name if target_kb else 'unknown')
-                    update_file_status(file_id, ProcessingStatus.COMPLETED,
+                    update_file_status(db, file_info, ProcessingStatus.COMPLETED,
                                      f"人工审核通过并加入知识库 [{kb_name}]: {reviewer_comment}")
-                    log_processing_step(file_id, "manual_approve", "success",
+                    log_processing_step(db, file_id, "manual_approve", "success",
                                       f"审核通过，加入知识库 [{kb_name}]: {reviewer_comment}")
                 else:
                     error_msg = f"加入知识库失败: {dify_result['error']}"
-                    update_file_status(file_id, ProcessingStatus.FAILED, error_msg)
-                    log_processing_step(file_id, "manual_approve", "failed", error_msg)
+                    update_file_status(db, file_info, ProcessingStatus.FAILED, error_msg)
+                    log_processing_step(db, file_id, "manual_approve", "failed", error_msg)
 
             except Exception as e:
                 error_msg = f"审核通过后处理失败: {str(e)}"
-                update_file_status(file_id, ProcessingStatus.FAILED, error_msg)
-                log_processing_step(file_id, "manual_approve", "failed", error_msg)
+                update_file_status(db, file_info, ProcessingStatus.FAILED, error_msg)
+                log_processing_step(db, file_id, "manual_approve", "failed", error_msg)
         else:
             # 审核不通过，跳过
-            update_file_status(file_id, ProcessingStatus.SKIPPED,
+            update_file_status(db, file_info, ProcessingStatus.SKIPPED,
                              f"人工审核未通过: {reviewer_comment}")
-            log_processing_step(file_id, "manual_reject", "success",
+            log_processing_step(db, file_id, "manual_reject", "success",
                               f"审核未通过: {reviewer_comment}")
 
         db.commit()
@@ -63,7 +63,8 @@ def load_system_snapshot() -> Dict[str, Any]:
     """调用后端获取系统状态快照"""
     try:
         url = get_system_api_url("status")
-        response = requests.get(url, timeout=30)  # 增加超时时间
+        # 设置页需要展示Celery活跃任务数，请求详细状态
+        response = requests.get(url, params={"detailed": "true"}, timeout=30)  # 增加超时时间
         response.raise_for_status()
         data = response.json()
         return data
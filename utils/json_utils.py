@@ -0,0 +1,30 @@
+import json
+from typing import Any, Union
+
+try:
+    import orjson
+except ImportError:  # 未安装orjson时使用标准库json
+    orjson = None
+
+
+def json_loads(text: Union[str, bytes]) -> Any:
+    """
+    解析JSON文本，已安装orjson时使用orjson
+
+    解析失败时抛出ValueError（orjson.JSONDecodeError同为其子类）
+    """
+    if orjson is not None:
+        return orjson.loads(text)
+    return json.loads(text)
+
+
+def json_dumps(obj: Any) -> str:
+    """
+    序列化为JSON字符串（非ASCII字符不转义），已安装orjson时使用orjson
+
+    Returns:
+        str: JSON字符串
+    """
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode('utf-8')
+    return json.dumps(obj, ensure_ascii=False)